@@ -0,0 +1,309 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+P波脉冲拾取系统命令行入口（无界面批处理）
+
+用法示例:
+    python src/cli.py sweep example_data --thresholds 0.02:0.2:0.01 --windows 0.5,1.0 --manual picks.csv
+    python src/cli.py replay example_data --chunk 50
+    python src/cli.py replay example_data --preprocess
+    python src/cli.py export example_data --picks picks.csv --format pdf --workers 4
+    python src/cli.py pick example_data --shard 0/4 --out-dir picks_out
+    python src/cli.py merge picks.csv picks_out
+    python src/cli.py qc example_data --out qc_index.csv --min-snr 3
+"""
+
+import argparse
+import glob
+import os
+import socket
+import sys
+import time
+
+from core.data_loader import DataLoader, get_p_arrival_time
+from core.pick_store import read_picks_csv, read_arrivals_csv
+from core.param_sweep import (parse_grid, sweep, agreement_stats, write_rows_csv,
+                              SWEEP_FIELDS, STATS_FIELDS)
+from core.stream_detector import replay_trace, replay_late_notification, results_match
+from core.batch_picker import BatchPicker
+from core.p_pulse_detector import PPulseDetector
+from core.detector_cache import DetectorCache
+from core.preprocessing import Preprocessor
+from core.quality import compute_quality, passes_quality, write_quality_csv, read_quality_csv
+from core.sharding import (parse_shard, shard_keys, ShardWriter, WorkQueue,
+                           pick_to_file, pick_from_queue, merge_shards)
+from gui.figure_export import export_figures
+
+
+def print_progress(done, total):
+    print(f"\r{done}/{total}", end='', file=sys.stderr, flush=True)
+    if done == total:
+        print(file=sys.stderr)
+
+
+def open_loader(args, three_component=False) -> DataLoader:
+    """扫描数据目录，并加载可选的外部P波到时表（miniSEED数据需要）"""
+    loader = DataLoader(args.data_dir, three_component=three_component)
+    loader.scan_files()
+    if args.arrivals:
+        loader.arrivals = read_arrivals_csv(args.arrivals)
+    return loader
+
+
+def cmd_sweep(args):
+    """参数扫描：输出每组参数的拾取表以及与手动拾取的一致性统计"""
+    loader = open_loader(args)
+
+    thresholds = parse_grid(args.thresholds)
+    window_lengths = parse_grid(args.windows)
+
+    start = time.perf_counter()
+    rows = sweep(loader, thresholds, window_lengths, pre=args.pre, progress=print_progress)
+    elapsed = time.perf_counter() - start
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    picks_path = os.path.join(args.out_dir, 'sweep_picks.csv')
+    write_rows_csv(picks_path, rows, SWEEP_FIELDS)
+    print(f"{len(rows)} picks for {len(thresholds) * len(window_lengths)} parameter sets "
+          f"in {elapsed:.2f} s -> {picks_path}")
+
+    if args.manual:
+        stats = agreement_stats(rows, read_picks_csv(args.manual), tolerance=args.tolerance)
+        stats_path = os.path.join(args.out_dir, 'sweep_stats.csv')
+        write_rows_csv(stats_path, stats, STATS_FIELDS)
+
+        def fmt(value):
+            return f"{value:.4f}" if isinstance(value, float) else str(value)
+
+        print("threshold  window  n_cmp  onset_mae  onset_tol  end_mae  polarity")
+        for row in stats:
+            print(f"{row['threshold_fraction']:9.3f}  {row['window_length']:6.2f}  {row['n_compared']:5d}  "
+                  f"{fmt(row['onset_mae']):>9}  {fmt(row['onset_within_tol']):>9}  "
+                  f"{fmt(row['end_mae']):>7}  {fmt(row['polarity_agreement']):>8}")
+        print(f"-> {stats_path}")
+
+
+def check_batch_preprocessing(loader):
+    """
+    With detection preprocessing enabled, compares BatchPicker picks (P windows read from
+    disk) with the interactive path (detect_station on the full record).
+    :return: (比较的台站数, 不一致的台站数)
+    """
+    detector = PPulseDetector(preprocessor=Preprocessor())
+    batch_picks = BatchPicker(loader, detector).run()
+    compared = mismatched = 0
+    for (event_id, station_id), batch in sorted(batch_picks.items()):
+        stream = loader.load_station_data(event_id, station_id)
+        z_trace = stream.select(component="Z") if stream else None
+        if not z_trace:
+            continue
+        p_arrival = get_p_arrival_time(z_trace[0])
+        if p_arrival == -12345.0:
+            continue
+        interactive = detector.detect_station(stream, p_arrival, loader.three_component)
+        compared += 1
+        if results_match(interactive, batch):
+            print(f"{event_id}/{station_id}: preprocessed window OK")
+        else:
+            mismatched += 1
+            print(f"{event_id}/{station_id}: preprocessed window MISMATCH\n"
+                  f"  full record: {interactive}\n  window:      {batch}")
+    return compared, mismatched
+
+
+def cmd_replay(args):
+    """
+    按块回放所有台站的Z分量，检查流式检测与批处理检测结果一致，
+    另检查P波通知较晚、随后一次送入超过缓冲区长度的数据块时窗口仍被检测；
+    --preprocess 时另外检查检测前预处理下批量拾取（读取P波窗口）与交互拾取（完整记录）结果一致
+    """
+    loader = open_loader(args)
+
+    compared = mismatched = 0
+    for event_id in sorted(loader.events):
+        for station_id in sorted(loader.events[event_id]):
+            stream = loader.load_station_data(event_id, station_id)
+            z_trace = stream.select(component="Z") if stream else None
+            if not z_trace:
+                continue
+            p_arrival = get_p_arrival_time(z_trace[0])
+            if p_arrival == -12345.0:
+                continue
+
+            streamed, batch = replay_trace(z_trace[0], p_arrival, chunk_size=args.chunk)
+            late, _ = replay_late_notification(z_trace[0], p_arrival)
+            compared += 1
+            if results_match(streamed, batch) and results_match(late, batch):
+                print(f"{event_id}/{station_id}: OK")
+            else:
+                mismatched += 1
+                print(f"{event_id}/{station_id}: MISMATCH\n  stream: {streamed}\n  late:   {late}\n  batch:  {batch}")
+
+    if args.preprocess:
+        checked, failed = check_batch_preprocessing(loader)
+        compared += checked
+        mismatched += failed
+
+    print(f"{compared - mismatched}/{compared} stations match")
+    return 1 if mismatched else 0
+
+
+def parse_station_keys(text):
+    """'event/station,event/station' -> [(event, station), ...]"""
+    return [tuple(item.strip().split('/', 1)) for item in text.split(',') if item.strip()]
+
+
+def cmd_export(args):
+    """批量导出台站波形图（Z分量、P波窗口和拾取标记）"""
+    loader = open_loader(args)
+
+    station_picks = read_picks_csv(args.picks) if args.picks else {}
+    keys = parse_station_keys(args.stations) if args.stations else None
+    stats = export_figures(loader, station_picks, args.out_dir, keys=keys, fmt=args.format,
+                           workers=args.workers, dpi=args.dpi, window_length=args.window)
+    print(f"{stats['exported']} figures in {stats['seconds']:.2f} s "
+          f"({stats['figures_per_second']:.1f} figures/s), {stats['failed']} failed -> {args.out_dir}")
+    return 1 if stats['failed'] else 0
+
+
+def cmd_pick(args):
+    """
+    批量自动拾取一个分片（--shard i/N）或从工作队列（--queue）领取台站，结果追加写入分片文件；
+    中断后以相同参数重新运行即可从断点继续
+    """
+    loader = open_loader(args, three_component=args.three_component)
+    detector = PPulseDetector(cache=DetectorCache(args.cache_dir) if args.cache_dir else None)
+    # 没有 --qc-index 时只为本分片或领取到的块计算质量指标
+    picker = BatchPicker(loader, detector, min_snr=args.min_snr, qc_on_demand=not args.qc_index)
+    keys = picker.station_keys()
+    if args.qc_index:
+        picker.quality = read_quality_csv(args.qc_index)
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    start = time.perf_counter()
+    if args.queue:
+        worker_id = args.worker_id or socket.gethostname()
+        queue = WorkQueue(args.queue)
+        if queue.populate(keys, chunk_size=args.batch_size):
+            print(f"queued {len(keys)} stations -> {args.queue}")
+        out_path = os.path.join(args.out_dir, f"picks-{worker_id}.csv")
+        with ShardWriter(out_path) as writer:
+            n = pick_from_queue(picker, queue, worker_id, writer, batch_size=args.batch_size,
+                                progress=lambda chunk_id, counts: print(f"chunk {chunk_id} done, queue: {counts}",
+                                                                        file=sys.stderr))
+        queue.close()
+    else:
+        index, count = parse_shard(args.shard)
+        keys = shard_keys(keys, index, count)
+        out_path = os.path.join(args.out_dir, f"picks-{index}-of-{count}.csv")
+        with ShardWriter(out_path) as writer:
+            if writer.done:
+                print(f"resuming: {len(writer.done)} stations already in {out_path}")
+            n = pick_to_file(picker, keys, writer, batch_size=args.batch_size, progress=print_progress)
+
+    print(f"{n} stations picked in {time.perf_counter() - start:.2f} s -> {out_path}")
+
+
+def cmd_qc(args):
+    """计算所有台站P波附近的质量指标并写入索引文件"""
+    loader = open_loader(args)
+
+    start = time.perf_counter()
+    index = compute_quality(loader, noise=args.noise, signal=args.signal, progress=print_progress)
+    elapsed = time.perf_counter() - start
+    write_quality_csv(args.out, index)
+    print(f"{len(index)} stations in {elapsed:.2f} s -> {args.out}")
+
+    if args.min_snr is not None:
+        rejected = [key for key, metrics in index.items() if not passes_quality(metrics, min_snr=args.min_snr)]
+        print(f"{len(rejected)} stations below SNR {args.min_snr}")
+
+
+def cmd_merge(args):
+    """合并分片结果文件；输入可以是CSV文件或包含分片文件的目录"""
+    paths = []
+    for item in args.inputs:
+        paths.extend(glob.glob(os.path.join(item, 'picks-*.csv')) if os.path.isdir(item) else [item])
+    n = merge_shards(paths, args.out)
+    print(f"{n} stations from {len(paths)} files -> {args.out}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="P-Pulse Picker batch tools")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    sweep_parser = subparsers.add_parser('sweep', help="evaluate a grid of detector parameters")
+    sweep_parser.add_argument('data_dir', help="data root directory (event/station SAC or miniSEED files)")
+    sweep_parser.add_argument('--arrivals', help="CSV of external P arrivals (event_id, station_id, p_time)")
+    sweep_parser.add_argument('--thresholds', default='0.05',
+                              help="threshold_fraction values: 'a,b,c' or 'start:stop:step'")
+    sweep_parser.add_argument('--windows', default='1.0',
+                              help="detection window lengths after P (s): 'a,b,c' or 'start:stop:step'")
+    sweep_parser.add_argument('--pre', type=float, default=0.5, help="seconds read before P")
+    sweep_parser.add_argument('--manual', help="CSV of manual picks to compare against")
+    sweep_parser.add_argument('--tolerance', type=float, default=0.01,
+                              help="onset tolerance (s) for the agreement fraction")
+    sweep_parser.add_argument('--out-dir', default='sweep_output')
+    sweep_parser.set_defaults(func=cmd_sweep)
+
+    replay_parser = subparsers.add_parser('replay', help="check streaming detection against batch detection")
+    replay_parser.add_argument('data_dir', help="data root directory (event/station SAC or miniSEED files)")
+    replay_parser.add_argument('--arrivals', help="CSV of external P arrivals (event_id, station_id, p_time)")
+    replay_parser.add_argument('--chunk', type=int, default=100, help="samples per chunk")
+    replay_parser.add_argument('--preprocess', action='store_true',
+                               help="also check batch picks against full-record picks with detection preprocessing")
+    replay_parser.set_defaults(func=cmd_replay)
+
+    export_parser = subparsers.add_parser('export', help="render station figures in parallel")
+    export_parser.add_argument('data_dir', help="data root directory (event/station SAC or miniSEED files)")
+    export_parser.add_argument('--arrivals', help="CSV of external P arrivals (event_id, station_id, p_time)")
+    export_parser.add_argument('--picks', help="CSV of picks to overlay")
+    export_parser.add_argument('--stations', help="subset to export: 'event/station,event/station'")
+    export_parser.add_argument('--format', choices=['png', 'pdf'], default='png')
+    export_parser.add_argument('--workers', type=int, default=None, help="worker processes (default: CPU count)")
+    export_parser.add_argument('--dpi', type=int, default=100)
+    export_parser.add_argument('--window', type=float, default=1.0, help="P window length (s) to highlight")
+    export_parser.add_argument('--out-dir', default='figures')
+    export_parser.set_defaults(func=cmd_export)
+
+    pick_parser = subparsers.add_parser('pick', help="batch auto-pick one shard, resumable")
+    pick_parser.add_argument('data_dir', help="data root directory (event/station SAC or miniSEED files)")
+    pick_parser.add_argument('--arrivals', help="CSV of external P arrivals (event_id, station_id, p_time)")
+    pick_parser.add_argument('--shard', default='0/1', help="'i/N': pick the i-th of N shards (0-based)")
+    pick_parser.add_argument('--queue', help="SQLite work queue on shared storage (instead of --shard)")
+    pick_parser.add_argument('--worker-id', help="worker name for --queue (default: host name)")
+    pick_parser.add_argument('--batch-size', type=int, default=256, help="stations per batch / queue chunk")
+    pick_parser.add_argument('--cache-dir', help="detector result cache directory")
+    pick_parser.add_argument('--three-component', action='store_true',
+                             help="also pick the N/1 and E/2 components (n_*/e_* columns) "
+                                  "and the vector peak amplitude/time")
+    pick_parser.add_argument('--qc-index', help="quality index CSV written by 'qc'")
+    pick_parser.add_argument('--min-snr', type=float, help="skip stations whose pre/post-P SNR is below this")
+    pick_parser.add_argument('--out-dir', default='picks_out')
+    pick_parser.set_defaults(func=cmd_pick)
+
+    qc_parser = subparsers.add_parser('qc', help="compute the quality index (SNR, clipping, gaps)")
+    qc_parser.add_argument('data_dir', help="data root directory (event/station SAC or miniSEED files)")
+    qc_parser.add_argument('--arrivals', help="CSV of external P arrivals (event_id, station_id, p_time)")
+    qc_parser.add_argument('--noise', type=float, default=2.0, help="noise window before P (s)")
+    qc_parser.add_argument('--signal', type=float, default=1.0, help="signal window after P (s)")
+    qc_parser.add_argument('--min-snr', type=float, help="report stations below this SNR")
+    qc_parser.add_argument('--out', default='qc_index.csv')
+    qc_parser.set_defaults(func=cmd_qc)
+
+    merge_parser = subparsers.add_parser('merge', help="merge shard pick files into one table")
+    merge_parser.add_argument('out', help="merged CSV")
+    merge_parser.add_argument('inputs', nargs='+', help="shard CSV files or directories of picks-*.csv")
+    merge_parser.set_defaults(func=cmd_merge)
+
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    sys.exit(args.func(args))
+
+
+if __name__ == '__main__':
+    main()
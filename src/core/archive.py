@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+直接从zip归档读取波形文件，无需解压
+归档内成员用 '<归档路径>::<成员名>' 形式的路径表示，与普通文件路径一样存放在 DataLoader.events 中
+"""
+
+import io
+import os
+import struct
+import threading
+import zipfile
+from collections import OrderedDict
+
+ARCHIVE_SEP = '::'
+# 同时保持打开的归档数上限（每个归档占用两个文件描述符）
+MAX_OPEN_ARCHIVES = 64
+# zip本地文件头：固定30字节，文件名长度和扩展字段长度位于第26、28字节
+_LOCAL_HEADER_SIZE = 30
+_LOCAL_HEADER_LENGTHS = struct.Struct('<HH')
+
+
+def member_path(archive_path, member_name) -> str:
+    return f"{archive_path}{ARCHIVE_SEP}{member_name}"
+
+
+def split_member_path(path):
+    """
+    Splits '<archive>::<member>' into (archive, member); plain paths give (None, path).
+    """
+    if ARCHIVE_SEP in path:
+        archive_path, member_name = path.split(ARCHIVE_SEP, 1)
+        return archive_path, member_name
+    return None, path
+
+
+class _StoredMemberReader(io.RawIOBase):
+    """
+    未压缩（ZIP_STORED）成员的随机读取：直接按偏移读取归档文件，
+    seek 不需要从头读取，只读头段时只读取632字节
+    """
+    def __init__(self, handle, data_offset, size):
+        super().__init__()
+        self._handle = handle
+        self._data_offset = data_offset
+        self._size = size
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += self._size
+        self._pos = min(max(offset, 0), self._size)
+        return self._pos
+
+    def close(self):
+        if not self.closed:
+            self._handle.release_reader()
+        super().close()
+
+    def readinto(self, buffer):
+        n = min(len(buffer), self._size - self._pos)
+        if n <= 0:
+            return 0
+        data = self._handle.pread(self._data_offset + self._pos, n)
+        buffer[:len(data)] = data
+        self._pos += len(data)
+        return len(data)
+
+
+class _ArchiveHandle:
+    """
+    一个归档的共享句柄：ZipFile（中央目录和压缩成员）+ 原始文件（未压缩成员的直接读取）
+    关闭后已打开的成员仍可读完：压缩成员由 ZipFile 自身的引用计数保持，原始文件在最后一个未压缩成员关闭时关闭
+    """
+    def __init__(self, archive_path):
+        self.zip_file = zipfile.ZipFile(archive_path, 'r')
+        self._raw = open(archive_path, 'rb')
+        self._lock = threading.Lock()
+        self._data_offsets = {}
+        self._readers = 0
+        self._closed = False
+
+    def pread(self, offset, n):
+        with self._lock:
+            self._raw.seek(offset)
+            return self._raw.read(n)
+
+    def data_offset(self, info: zipfile.ZipInfo):
+        """成员数据在归档中的起始偏移（需读取本地文件头中的变长字段长度）"""
+        if info.filename not in self._data_offsets:
+            header = self.pread(info.header_offset, _LOCAL_HEADER_SIZE)
+            name_len, extra_len = _LOCAL_HEADER_LENGTHS.unpack(header[26:30])
+            self._data_offsets[info.filename] = info.header_offset + _LOCAL_HEADER_SIZE + name_len + extra_len
+        return self._data_offsets[info.filename]
+
+    def open(self, member_name):
+        info = self.zip_file.getinfo(member_name)
+        if info.compress_type == zipfile.ZIP_STORED:
+            data_offset = self.data_offset(info)
+            with self._lock:
+                self._readers += 1
+            return io.BufferedReader(_StoredMemberReader(self, data_offset, info.file_size))
+        # 压缩成员按需流式解压
+        return self.zip_file.open(info)
+
+    def release_reader(self):
+        with self._lock:
+            self._readers -= 1
+            if self._closed and self._readers == 0:
+                self._raw.close()
+
+    def close(self):
+        self.zip_file.close()
+        with self._lock:
+            self._closed = True
+            if self._readers == 0:
+                self._raw.close()
+
+
+class ArchivePool:
+    """
+    已打开归档的LRU池：同一归档的所有加载共享一个句柄（线程安全），
+    打开的归档超过 max_open 个时关闭最久未使用的一个
+    """
+    def __init__(self, max_open=MAX_OPEN_ARCHIVES):
+        self.max_open = max_open
+        self._handles = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, archive_path) -> _ArchiveHandle:
+        """在锁内取得句柄，必要时打开并关闭最久未使用的句柄"""
+        archive_path = os.path.abspath(archive_path)
+        handle = self._handles.get(archive_path)
+        if handle is None:
+            handle = _ArchiveHandle(archive_path)
+            self._handles[archive_path] = handle
+            while len(self._handles) > self.max_open:
+                self._handles.popitem(last=False)[1].close()
+        self._handles.move_to_end(archive_path)
+        return handle
+
+    def open(self, archive_path, member_name):
+        """打开归档成员；在池锁内打开，句柄不会在打开过程中被关闭"""
+        with self._lock:
+            return self._get(archive_path).open(member_name)
+
+    def getinfo(self, archive_path, member_name) -> zipfile.ZipInfo:
+        with self._lock:
+            return self._get(archive_path).zip_file.getinfo(member_name)
+
+    def reset_after_fork(self):
+        """
+        Drops the handles inherited by a forked child process. Their file descriptors
+        share seek offsets with the parent and the other children, so each process
+        must open its own. The inherited locks may be held by a parent thread, so the
+        handles are not closed here; their descriptors close when they are collected.
+        """
+        self._handles = OrderedDict()
+        self._lock = threading.Lock()
+
+    def close_all(self):
+        with self._lock:
+            for handle in self._handles.values():
+                handle.close()
+            self._handles.clear()
+
+
+archive_pool = ArchivePool()
+
+
+def list_members(archive_path) -> list:
+    """
+    Member names of an archive, from the central directory only (no decompression).
+    The archive is closed again; reads reopen it through the pool.
+    """
+    with zipfile.ZipFile(archive_path, 'r') as zip_file:
+        return [info.filename for info in zip_file.infolist() if not info.is_dir()]
+
+
+def open_source(path):
+    """
+    Opens a plain file or an archive member for binary reading.
+    """
+    archive_path, member_name = split_member_path(path)
+    if archive_path is None:
+        return open(path, 'rb')
+    return archive_pool.open(archive_path, member_name)
+
+
+def source_identity(paths) -> list:
+    """
+    Cheap identity of plain files or archive members, without reading their content:
+    (path, size, mtime_ns) for files; archive size/mtime plus member CRC for members.
+    """
+    identity = []
+    for path in sorted(paths):
+        archive_path, member_name = split_member_path(path)
+        st = os.stat(archive_path or path)
+        entry = [path, st.st_size, st.st_mtime_ns]
+        if archive_path is not None:
+            entry.append(archive_pool.getinfo(archive_path, member_name).CRC)
+        identity.append(entry)
+    return identity
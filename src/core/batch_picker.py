@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+批量自动拾取：逐台站只读取P波附近的数据窗口并运行脉冲检测
+"""
+
+from numbers import Real
+
+from core.data_loader import DataLoader, get_p_arrival_time
+from core.p_pulse_detector import PPulseDetector
+from core.detector_cache import MISS
+from core.archive import source_identity
+from core.quality import compute_quality, passes_quality
+from core.pick_store import HORIZONTAL_PREFIXES
+from utils.hashing import make_key
+
+# 拾取结果中以“相对记录起点的秒数”表示的字段
+TIME_KEYS = (('p_arrival', 'onset_time', 'end_time', 'peak_time', 'vector_peak_time') +
+             tuple(f"{prefix}_{field}" for prefix in HORIZONTAL_PREFIXES
+                   for field in ('onset_time', 'end_time', 'peak_time')))
+
+
+def shift_pick_times(picks: dict, offset: float) -> dict:
+    """
+    Shifts the time-valued picks by offset seconds (window start -> record start).
+    """
+    shifted = dict(picks)
+    for key in TIME_KEYS:
+        if isinstance(shifted.get(key), Real):
+            shifted[key] = shifted[key] + offset
+    return shifted
+
+
+class BatchPicker:
+    def __init__(self, loader: DataLoader, detector: PPulseDetector, pre=0.5, post=1.5,
+                 quality=None, min_snr=None, qc_on_demand=False):
+        self.loader = loader
+        self.detector = detector
+        # 读取窗口：P波前pre秒到P波后post秒，需覆盖检测窗口（P波后1秒）
+        self.pre = pre
+        self.post = post
+        # 可选的质量索引 { (event_id, station_id): metrics }：信噪比低于 min_snr 的台站不拾取
+        self.quality = quality or {}
+        self.min_snr = min_snr
+        # 没有质量索引时，只为实际要拾取的台站计算质量指标（分片或领取的块），而不是全部台站
+        self.qc_on_demand = qc_on_demand
+        self._qc_computed = set()
+
+    def station_keys(self):
+        """
+        All (event_id, station_id) pairs known to the loader, in sorted order.
+        """
+        return [(event_id, station_id)
+                for event_id in sorted(self.loader.events)
+                for station_id in sorted(self.loader.events[event_id])]
+
+    def pick_station(self, event_id, station_id):
+        """
+        Runs the detector on the P window of one station.
+        Returned times are relative to the start of the full record, like GUI picks.
+        If the detector has a cache, unchanged files are not read at all.
+        """
+        return self._pick_batch([(event_id, station_id)])[0][1]
+
+    def cache_key(self, event_id, station_id):
+        """
+        Cache key from the station's file identity, external arrival (if any),
+        the read window and detector parameters.
+        """
+        paths = set(self.loader.events[event_id][station_id].values())
+        # v2: 三分量结果包含水平分量的脉冲参数
+        return make_key('batch_pick_v2', source_identity(paths), station_id,
+                        self.loader.arrivals.get((event_id, station_id)), self.pre, self.post,
+                        self.loader.three_component, self.detector.params)
+
+    def _pick_batch(self, keys):
+        """
+        Picks a batch of stations: cached stations are skipped, the others' windows are
+        loaded and, if the detector preprocesses, filtered together as one 2-D batch.
+        :return: [ ((event_id, station_id), picks) ]
+        """
+        cache = self.detector.cache
+        picked = {}
+        cache_keys = {}
+        for key in keys:
+            if cache is not None:
+                cache_keys[key] = self.cache_key(*key)
+                picks = cache.get(cache_keys[key])
+                if picks is not MISS:
+                    picked[key] = picks
+
+        to_load = [key for key in keys if key not in picked]
+        # 检测前预处理需要检测窗口两侧的填充段，读取窗口至少覆盖它
+        pad = self.detector.preprocess_pad()
+        streams = self.loader.load_windows(to_load, max(self.pre, pad),
+                                           max(self.post, self.detector.window_length + pad))
+
+        preprocessor = self.detector.preprocessor
+        if preprocessor is not None:
+            # 与检测时相同的数据段一次批量滤波，结果进入预处理缓存，随后逐台站检测时直接命中
+            spans = []
+            for stream in streams.values():
+                z_trace = stream.select(component="Z") if stream else None
+                p_arrival = get_p_arrival_time(z_trace[0]) if z_trace else -12345.0
+                if p_arrival != -12345.0:
+                    spans += self.detector.preprocess_spans(list(stream), p_arrival)
+            preprocessor.process_traces(spans)
+
+        for key in to_load:
+            picks = self._detect_stream(streams[key])
+            if cache is not None:
+                picks = cache.put(cache_keys[key], picks)
+            picked[key] = picks
+
+        return [(key, picked[key]) for key in keys]
+
+    def _detect_stream(self, stream):
+        if not stream:
+            return None
+
+        z_trace = stream.select(component="Z")
+        if not z_trace:
+            return None
+
+        trace = z_trace[0]
+        p_arrival = get_p_arrival_time(trace)
+        if p_arrival == -12345.0:
+            return None
+
+        results = self.detector.detect_station(stream, p_arrival, self.loader.three_component)
+        if not results:
+            return None
+        return shift_pick_times(results, trace.stats.window_offset)
+
+    def filter_keys(self, keys) -> list:
+        """
+        Drops stations whose quality index SNR is below min_snr. With qc_on_demand,
+        metrics missing from the index are computed for these keys only.
+        """
+        if self.min_snr is None:
+            return list(keys)
+        keys = list(keys)
+        if self.qc_on_demand:
+            missing = [key for key in keys if key not in self.quality and key not in self._qc_computed]
+            if missing:
+                self.quality.update(compute_quality(self.loader, missing))
+                self._qc_computed.update(missing)
+        return [key for key in keys if passes_quality(self.quality.get(key), min_snr=self.min_snr)]
+
+    def iter_batches(self, keys, batch_size=256):
+        """
+        Picks the given keys batch_size stations at a time, skipping stations rejected by filter_keys.
+        :return: 生成器，每批产生 [ ((event_id, station_id), picks) ]，检测失败的台站 picks 为 None
+        """
+        keys = self.filter_keys(keys)
+        for start in range(0, len(keys), batch_size):
+            yield self._pick_batch(keys[start:start + batch_size])
+
+    def run(self, keys=None, progress=None, batch_size=256) -> dict:
+        """
+        Picks every station (or the given keys), batch_size stations at a time.
+        :param progress: 可选回调 progress(done, total)
+        :return: { (event_id, station_id): picks }，检测失败的台站不包含在内
+        """
+        keys = self.filter_keys(self.station_keys() if keys is None else keys)
+        results = {}
+        done = 0
+        for batch in self.iter_batches(keys, batch_size):
+            for key, picks in batch:
+                if picks:
+                    results[key] = picks
+            done += len(batch)
+            if progress:
+                progress(done, len(keys))
+        return results
@@ -2,21 +2,53 @@
 # -*- coding: utf-8 -*-
 
 import os
-from obspy import read
+import weakref
+from collections import OrderedDict
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
 from obspy.core.trace import Trace
 from obspy.core.stream import Stream
 
+from core.archive import list_members, member_path
+from core.readers import default_backends, file_name_of
+from core.memory_budget import memory_budget, to_float32
+from core.pick_store import merge_component_picks
+
+_MISSING = object()
+
 class DataLoader:
-    def __init__(self, base_dir):
+    def __init__(self, base_dir, three_component=False, backends=None, window_cache_size=4096):
         self.base_dir = base_dir
+        # 三分量模式下索引并加载所有分量（Z/N/E 或 Z/1/2），否则只处理Z分量
+        self.three_component = three_component
+        # 读取后端，按顺序匹配文件名（见 core.readers）
+        self.backends = backends if backends is not None else default_backends()
         self.events = {}
+        # 从SAC头段读回的已保存拾取结果 { (event_id, station_id): picks }
+        self.header_picks = {}
+        # 外部提供的P波绝对到时 { (event_id, station_id): UTCDateTime }，用于头段中没有到时的格式（miniSEED）
+        self.arrivals = {}
+        # P波窗口的LRU缓存，所有格式的窗口读取共用；条目同时登记到全局内存预算，超出预算时被释放
+        self.window_cache_size = window_cache_size
+        self._window_cache = OrderedDict()
+        self._budget_owner = object()
+        weakref.finalize(self, memory_budget.release_owner, self._budget_owner)
 
-    def scan_files(self):
+    def scan_files(self, harvest_picks=False):
         """
-        Scans the directory and organizes SAC files by event and station.
-        It finds Z-component files ending in *Z.SAC or *Z.
+        Scans the directory and organizes waveform files by event and station.
+        Each file is indexed by the first backend matching its name: SAC files
+        named NET.STA.COMP[.SAC] by name only, miniSEED files from their record
+        headers (one file may hold many stations and channels). Only Z components
+        are kept, or every component when three-component mode is enabled.
+        Zip archives are treated as event containers and indexed from their
+        central directory without extraction; files already present in an
+        extracted directory of the same name take precedence.
+        With harvest_picks, picks previously written to the SAC headers are
+        read back as well (see harvest_header_picks).
         """
-        for event_dir in os.listdir(self.base_dir):
+        entries = sorted(os.listdir(self.base_dir))
+        for event_dir in entries:
             event_path = os.path.join(self.base_dir, event_dir)
             if os.path.isdir(event_path):
                 self.events[event_dir] = {}
@@ -24,48 +56,226 @@ class DataLoader:
                     full_path = os.path.join(event_path, sac_file)
                     if not os.path.isfile(full_path):
                         continue
+                    self._add_file(event_dir, sac_file, full_path)
+
+        for archive in entries:
+            archive_path = os.path.join(self.base_dir, archive)
+            if archive.upper().endswith('.ZIP') and os.path.isfile(archive_path):
+                self._scan_archive(archive_path)
+
+        self.clear_window_cache()
+        if harvest_picks:
+            self.harvest_header_picks()
+
+    def backend_for(self, path):
+        """读取该文件的后端，没有匹配的后端时为None"""
+        file_name = file_name_of(path)
+        return next((backend for backend in self.backends if backend.matches(file_name)), None)
+
+    def harvest_header_picks(self, workers=8) -> dict:
+        """
+        Reads the picks written by save_results_to_sac (t4-t7, user0, user1) back from
+        the SAC headers. Only the 632-byte headers are read, with a thread pool; no waveform
+        data is decoded. Formats without header picks are skipped.
+        In three-component mode the horizontal headers are read as well and their picks
+        stored under the 'n_' / 'e_' prefixes (see merge_component_picks).
+        Stores and returns { (event_id, station_id): picks } for stations that have picks.
+        """
+        tasks = []
+        for event_id, stations in self.events.items():
+            for station_id, station_files in stations.items():
+                for component in self._components(station_files):
+                    tasks.append(((event_id, station_id), component_order(component), station_files[component]))
+
+        def read_picks(path):
+            try:
+                return self.backend_for(path).header_picks(path)
+            except Exception as e:
+                print(f"Error reading header of {path}: {e}")
+                return {}
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = pool.map(read_picks, [path for _, _, path in tasks])
+            per_station = {}
+            for (key, order, _), picks in zip(tasks, results):
+                per_station.setdefault(key, {})[order] = picks
+
+        self.header_picks = {}
+        for key, per_component in per_station.items():
+            picks = merge_component_picks(per_component)
+            if picks:
+                self.header_picks[key] = picks
+        return self.header_picks
+
+    def _scan_archive(self, archive_path):
+        """
+        Indexes the members of a zip archive. Members inside a top-level directory
+        belong to the event named after that directory, others to the archive name.
+        """
+        default_event = os.path.splitext(os.path.basename(archive_path))[0]
+        try:
+            members = list_members(archive_path)
+        except Exception as e:
+            print(f"Error reading archive {archive_path}: {e}")
+            return
+
+        for member in members:
+            parts = member.split('/')
+            event_id = parts[0] if len(parts) > 1 else default_event
+            self.events.setdefault(event_id, {})
+            # 已解压目录中的同名文件优先
+            self._add_file(event_id, parts[-1], member_path(archive_path, member), overwrite=False)
+
+    def _add_file(self, event_id, file_name, full_path, overwrite=True):
+        backend = next((backend for backend in self.backends if backend.matches(file_name)), None)
+        if backend is None:
+            return
+        try:
+            pairs = backend.index_file(full_path, file_name)
+        except Exception as e:
+            print(f"Error indexing {full_path}: {e}")
+            return
+
+        for station, component in pairs:
+            if not (self.three_component or component.upper().endswith('Z')):
+                continue
+            if station not in self.events[event_id]:
+                self.events[event_id][station] = {}
+            if overwrite or component not in self.events[event_id][station]:
+                self.events[event_id][station][component] = full_path
+
+    def _request(self, event_id, station_id, component):
+        """后端读取请求 (path, station_id, component, 外部P波到时)"""
+        return (self.events[event_id][station_id][component], station_id, component,
+                self.arrivals.get((event_id, station_id)))
 
-                    # Unified handling for file names like 'NET.STA.COMP.SAC' or 'NET.STA.COMP'
-                    sac_file_upper = sac_file.upper()
-                    if sac_file_upper.endswith('.SAC'):
-                        file_name_no_ext = sac_file[:-4]
-                    else:
-                        file_name_no_ext = sac_file
-
-                    parts = file_name_no_ext.split('.')
-                    
-                    if len(parts) >= 3 and parts[-1].upper().endswith('Z'):
-                        station = ".".join(parts[:-1])
-                        component = parts[-1]
-                        if station not in self.events[event_dir]:
-                            self.events[event_dir][station] = {}
-                        self.events[event_dir][station][component] = os.path.join(event_path, sac_file)
+    def _read(self, event_id, station_id, component) -> Stream:
+        request = self._request(event_id, station_id, component)
+        try:
+            trace = self.backend_for(request[0]).read(request)
+        except Exception as e:
+            print(f"Error reading {request[0]}: {e}")
+            return Stream()
+        if trace is None:
+            return Stream()
+        trace.data = to_float32(trace.data)
+        return Stream([trace])
+
+    def _components(self, station_files, z_only=False) -> list:
+        """要加载的分量：三分量模式下（z_only 除外）按 Z, N/1, E/2 排序的所有分量，否则为Z分量"""
+        if self.three_component and not z_only:
+            return sorted(station_files, key=component_order)
+        return [comp for comp in station_files if comp.upper().endswith('Z')][:1]
 
     def load_station_data(self, event_id, station_id) -> Stream:
         """
         Loads Z-component data for a specific event and station.
+        In three-component mode all components are loaded, each file read once.
+        Samples are stored as contiguous float32 when that is lossless (see core.memory_budget).
         """
         if event_id not in self.events or station_id not in self.events[event_id]:
             return None
         
-        station_files = self.events[event_id][station_id]
         stream = Stream()
-        # 假设Z分量的标识符在文件名中是 'DHZ' 或类似的
-        z_component = next((comp for comp in station_files if comp.upper().endswith('Z')), None)
-
-        if z_component and z_component in station_files:
-            try:
-                trace = read(station_files[z_component])[0]
-                stream.append(trace)
-            except Exception as e:
-                print(f"Error reading {station_files[z_component]}: {e}")
+        for component in self._components(self.events[event_id][station_id]):
+            stream += self._read(event_id, station_id, component)
         return stream
 
+    def load_window(self, event_id, station_id, pre=0.5, post=1.5, z_only=False) -> Stream:
+        """
+        Loads only the samples from p_arrival - pre to p_arrival + post (seconds).
+        SAC windows are located from the header's b, delta and t1/t3; miniSEED windows
+        from the record index and the external arrival. Only the overlapping part of
+        the file is read.
+        Each trace carries stats.window_offset, its start relative to the full record.
+        """
+        return self.load_windows([(event_id, station_id)], pre, post, workers=1,
+                                 z_only=z_only)[(event_id, station_id)]
+
+    def load_windows(self, keys, pre=0.5, post=1.5, workers=8, z_only=False) -> dict:
+        """
+        Loads P windows for many (event_id, station_id) pairs. Windows not in the cache
+        are read in one bulk call per backend (thread pool for small reads, one read per
+        file for multi-channel files), then cached.
+        :param z_only: 只读取Z分量（三分量模式下也不读取水平分量），用于只需要Z分量的调用者
+        Returns { (event_id, station_id): Stream }, None for unknown stations.
+        """
+        keys = list(keys)
+        wanted = {}
+        for key in keys:
+            if key[0] in self.events and key[1] in self.events[key[0]]:
+                wanted[key] = [self._request(*key, component)
+                               for component in self._components(self.events[key[0]][key[1]], z_only)]
+
+        cached = {}
+        missing = {}
+        for requests in wanted.values():
+            for request in requests:
+                cache_key = self._window_key(request, pre, post)
+                # 条目可能被其他线程登记的数据挤出预算而释放，只按一次查找的结果判断
+                entry = self._window_cache.get(cache_key, _MISSING)
+                if entry is not _MISSING:
+                    cached[cache_key] = entry
+                    try:
+                        self._window_cache.move_to_end(cache_key)
+                    except KeyError:
+                        pass
+                    memory_budget.touch((self._budget_owner, cache_key))
+                else:
+                    missing.setdefault(self.backend_for(request[0]), []).append(request)
+
+        for backend, requests in missing.items():
+            for request, trace in zip(requests, backend.read_windows(requests, pre, post, workers)):
+                if trace is not None:
+                    # 缓存中的数据只读，返回给调用者的 Trace 共享数据、复制头段
+                    trace.data = to_float32(trace.data)
+                    trace.data.flags.writeable = False
+                cache_key = self._window_key(request, pre, post)
+                cached[cache_key] = trace
+                self._remember_window(cache_key, trace)
+
+        streams = {}
+        for key in keys:
+            if key not in wanted:
+                streams[key] = None
+                continue
+            traces = [cached[self._window_key(request, pre, post)] for request in wanted[key]]
+            streams[key] = Stream([Trace(data=trace.data, header=trace.stats) for trace in traces if trace is not None])
+        return streams
+
+    @staticmethod
+    def _window_key(request, pre, post):
+        path, station_id, component, p_arrival = request
+        return (path, station_id, component, str(p_arrival), pre, post)
+
+    def _remember_window(self, cache_key, trace):
+        self._window_cache[cache_key] = trace
+        self._window_cache.move_to_end(cache_key)
+        while len(self._window_cache) > self.window_cache_size:
+            evicted, _ = self._window_cache.popitem(last=False)
+            memory_budget.release((self._budget_owner, evicted))
+        # 登记在最后：超出预算时可能立即释放较早的窗口
+        memory_budget.register((self._budget_owner, cache_key), trace.data.nbytes if trace is not None else 0,
+                               'windows', on_evict=partial(self._window_cache.pop, cache_key, None))
+
+    def clear_window_cache(self):
+        self._window_cache.clear()
+        memory_budget.release_owner(self._budget_owner)
+
+def component_order(component: str) -> int:
+    """
+    Sort key placing components in Z, N/1, E/2 order.
+    """
+    return {'Z': 0, 'N': 1, '1': 1, 'E': 2, '2': 2}.get(component.upper()[-1:], 3)
+
 def get_p_arrival_time(trace: Trace) -> float:
     """
-    Reads the P-wave arrival time from the SAC header.
-    Priority: t1 > t3
+    Reads the P-wave arrival time from the SAC header, relative to the trace start.
+    Priority: t1 > t3. Traces of formats without header picks use the external
+    arrival attached by the reader (stats.p_arrival).
     """
+    if 'p_arrival' in trace.stats:
+        return float(trace.stats.p_arrival - trace.stats.starttime)
     if hasattr(trace.stats, 'sac'):
         sac_header = trace.stats.sac
         p_time = -12345.0
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+P脉冲检测结果的缓存：内存LRU层 + 可选的磁盘层
+缓存键由数据身份（内容哈希或文件身份）和检测参数共同决定
+"""
+
+import json
+import os
+from collections import OrderedDict
+import numpy as np
+
+# 缓存未命中的标记（None 本身是合法的缓存值：表示检测失败）
+MISS = object()
+
+
+def _to_builtin(value):
+    """numpy标量转换为Python内置类型，便于JSON序列化"""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, dict):
+        return {k: _to_builtin(v) for k, v in value.items()}
+    return value
+
+
+class DetectorCache:
+    def __init__(self, cache_dir=None, max_entries=10000):
+        # cache_dir 为 None 时只使用内存缓存
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self._memory = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + '.json')
+
+    def get(self, key):
+        """
+        Returns the cached result for key, or MISS.
+        Disk hits are promoted to the memory tier.
+        """
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            self.hits += 1
+            return self._copy(self._memory[key])
+
+        if self.cache_dir:
+            path = self._disk_path(key)
+            try:
+                with open(path, 'r') as f:
+                    value = json.load(f)
+            except (OSError, ValueError):
+                value = MISS
+            if value is not MISS:
+                self._remember(key, value)
+                self.hits += 1
+                return self._copy(value)
+
+        self.misses += 1
+        return MISS
+
+    def put(self, key, result):
+        """
+        Stores a detection result (dict or None) under key in both tiers.
+        """
+        value = _to_builtin(result)
+        self._remember(key, value)
+
+        if self.cache_dir:
+            path = self._disk_path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = path + '.tmp'
+            try:
+                with open(tmp_path, 'w') as f:
+                    json.dump(value, f)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                print(f"Error writing cache entry {path}: {e}")
+        return self._copy(value)
+
+    def clear(self):
+        """清空内存层（磁盘层保留）"""
+        self._memory.clear()
+
+    def _remember(self, key, value):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    @staticmethod
+    def _copy(value):
+        return dict(value) if isinstance(value, dict) else value
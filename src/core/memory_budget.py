@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+全局内存预算：缓存、视图和图形登记各自持有的字节数，总量超出预算时
+按最近最少使用的顺序调用可释放项的回调（缓存条目），不可释放的项（正在显示的数据）只计入用量
+另提供采样数据的 float32 规整：在精度足够时把 float64/整数数据转换为连续的 float32
+"""
+
+import threading
+from collections import OrderedDict
+import numpy as np
+
+# float32 能精确表示的最大整数
+_FLOAT32_EXACT_INT = 2 ** 24
+
+
+def to_float32(data, rtol=1e-6):
+    """
+    Returns data as a contiguous native float32 array when that is lossless enough,
+    otherwise data unchanged (as a contiguous array):
+    - 整数：所有值的绝对值不超过 2**24（可精确表示）
+    - 浮点：转换误差不超过 rtol * 最大绝对值，且没有溢出
+    """
+    data = np.ascontiguousarray(data)
+    if data.dtype == np.float32 and data.dtype.isnative:
+        return data
+    if data.size == 0 or data.dtype.kind not in 'iuf':
+        return data
+
+    if data.dtype.kind in 'iu':
+        if data.dtype.itemsize <= 2 or np.abs(data).max() <= _FLOAT32_EXACT_INT:
+            return data.astype(np.float32)
+        return data
+
+    compact = data.astype(np.float32)
+    finite = np.isfinite(data)
+    if not np.array_equal(finite, np.isfinite(compact)):
+        return data
+    peak = np.abs(data[finite]).max() if finite.any() else 0.0
+    error = np.abs(compact[finite].astype(data.dtype) - data[finite]).max() if finite.any() else 0.0
+    return compact if error <= rtol * peak else data
+
+
+class MemoryBudget:
+    """
+    登记项 key -> (字节数, 类别, 释放回调)，按使用先后排序
+    - register: 登记或更新一项，并在超出预算时释放最久未使用的可释放项（不会释放刚登记的项）
+    - touch: 标记为最近使用
+    - release: 持有者自行释放后注销（重复注销无影响）
+    键约定为 (持有者, 条目)，持有者为任意唯一对象；释放回调在锁外调用，回调中只需丢弃持有者自己的引用
+    """
+    def __init__(self, limit_bytes=1 << 30):
+        self.limit_bytes = limit_bytes
+        self._entries = OrderedDict()
+        self._total = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def register(self, key, nbytes, category, on_evict=None):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._total -= old[0]
+            self._entries[key] = (int(nbytes), category, on_evict)
+            self._total += int(nbytes)
+            victims = self._select_victims(protect=key)
+        self._evict(victims)
+
+    def touch(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+
+    def release(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._total -= entry[0]
+
+    def release_owner(self, owner):
+        """注销键为 (owner, ...) 的所有项，用于持有者清空或被回收时"""
+        with self._lock:
+            for key in [key for key in self._entries if isinstance(key, tuple) and key and key[0] is owner]:
+                self._total -= self._entries.pop(key)[0]
+
+    def set_limit(self, limit_bytes):
+        with self._lock:
+            self.limit_bytes = limit_bytes
+            victims = self._select_victims()
+        self._evict(victims)
+
+    def usage(self) -> dict:
+        """
+        {'total': 总字节数, 'limit': 预算, 'categories': {类别: 字节数}, 'evictions': 累计释放项数}
+        """
+        with self._lock:
+            categories = {}
+            for nbytes, category, _ in self._entries.values():
+                categories[category] = categories.get(category, 0) + nbytes
+            return {'total': self._total, 'limit': self.limit_bytes,
+                    'categories': categories, 'evictions': self.evictions}
+
+    def _select_victims(self, protect=None) -> list:
+        """在锁内选出需要释放的项并注销"""
+        victims = []
+        if self._total <= self.limit_bytes:
+            return victims
+        for key, (nbytes, _, on_evict) in list(self._entries.items()):
+            if self._total <= self.limit_bytes:
+                break
+            if on_evict is None or key == protect:
+                continue
+            del self._entries[key]
+            self._total -= nbytes
+            victims.append(on_evict)
+        self.evictions += len(victims)
+        return victims
+
+    @staticmethod
+    def _evict(victims):
+        for on_evict in victims:
+            on_evict()
+
+
+memory_budget = MemoryBudget()
@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+miniSEED文件的底层读取：只解析每个记录的48字节固定头段和blockette 1000/1001建立记录索引，
+读取时间窗口时只读取并解码与窗口重叠的记录
+"""
+
+import calendar
+import io
+import math
+import struct
+import numpy as np
+from obspy import read, UTCDateTime
+
+# 固定头段：序号、质量标记、台站、位置、通道、台网、BTIME起始时间、采样点数、采样率因子/乘数、
+# 标志位、blockette数、时间校正、数据偏移、第一个blockette偏移
+FIXED_HEADER_SIZE = 48
+_FIXED_HEADER = '6scx5s2s3s2sHHBBBxHHhhBBBBiHH'
+_BLOCKETTE_HEADER = 'HH'
+# 读取头段区域的字节数：固定头段 + blockette 1000/1001 通常都在前64字节内
+_HEADER_READ_SIZE = 128
+_DATA_QUALITY_CODES = b'DRQM'
+# 活动标志第1位：时间校正已应用到起始时间
+_TIME_CORRECTION_APPLIED = 0x02
+
+
+def _byte_order(head: bytes) -> str:
+    """按起始年份是否合理判断字节序（大端为SEED标准）"""
+    year = struct.unpack('>H', head[20:22])[0]
+    return '>' if 1900 <= year <= 2100 else '<'
+
+
+def _sampling_rate(factor, multiplier) -> float:
+    if factor == 0:
+        return 0.0
+    if factor > 0 and multiplier > 0:
+        return float(factor * multiplier)
+    if factor > 0 and multiplier < 0:
+        return -factor / multiplier
+    if factor < 0 and multiplier > 0:
+        return -multiplier / factor
+    return 1.0 / (factor * multiplier)
+
+
+def parse_record_header(head: bytes) -> dict:
+    """
+    Parses the fixed header and blockettes 1000/1001 at the start of a record.
+    :param head: 记录开头的字节（至少包含固定头段和blockette 1000）
+    :return: {'seed_id', 'start' (POSIX秒), 'npts', 'sampling_rate', 'length', 'is_data'}
+    """
+    order = _byte_order(head)
+    (_, quality, station, location, channel, network,
+     year, doy, hour, minute, second, frac, npts, factor, multiplier,
+     activity, _, _, _, time_correction, _, blockette_offset) = struct.unpack(order + _FIXED_HEADER,
+                                                                             head[:FIXED_HEADER_SIZE])
+
+    start = (calendar.timegm((year, 1, 1, hour, minute, second)) + (doy - 1) * 86400.0 + frac * 1e-4)
+    if time_correction and not activity & _TIME_CORRECTION_APPLIED:
+        start += time_correction * 1e-4
+
+    length = None
+    while blockette_offset and blockette_offset + 8 <= len(head):
+        kind, next_offset = struct.unpack(order + _BLOCKETTE_HEADER, head[blockette_offset:blockette_offset + 4])
+        if kind == 1000:
+            length = 2 ** head[blockette_offset + 6]
+        elif kind == 1001:
+            start += struct.unpack('b', head[blockette_offset + 5:blockette_offset + 6])[0] * 1e-6
+        blockette_offset = next_offset
+
+    if length is None:
+        raise ValueError("miniSEED record without blockette 1000")
+
+    seed_id = '.'.join(part.decode('ascii', 'replace').strip() for part in (network, station, location, channel))
+    return {
+        'seed_id': seed_id,
+        'start': start,
+        'npts': npts,
+        'sampling_rate': _sampling_rate(factor, multiplier),
+        'length': length,
+        'is_data': quality in _DATA_QUALITY_CODES
+    }
+
+
+def index_records(f) -> dict:
+    """
+    Builds the record index of a miniSEED file by reading only the record headers.
+    :param f: 以 'rb' 打开的可 seek 文件对象
+    :return: { seed_id: {'offset', 'length', 'start', 'end' (各记录的数组，按起始时间排序), 'sampling_rate'} }
+    """
+    columns = {}
+    offset = 0
+    while True:
+        f.seek(offset)
+        head = f.read(_HEADER_READ_SIZE)
+        if len(head) < FIXED_HEADER_SIZE:
+            break
+        info = parse_record_header(head)
+        if info['is_data'] and info['npts'] and info['sampling_rate'] > 0:
+            end = info['start'] + (info['npts'] - 1) / info['sampling_rate']
+            rows = columns.setdefault(info['seed_id'], {'rows': [], 'sampling_rate': info['sampling_rate']})
+            rows['rows'].append((offset, info['length'], info['start'], end))
+        offset += info['length']
+
+    index = {}
+    for seed_id, entry in columns.items():
+        rows = np.array(entry['rows'], dtype=np.float64)
+        rows = rows[np.argsort(rows[:, 2], kind='stable')]
+        index[seed_id] = {
+            'offset': rows[:, 0].astype(np.int64),
+            'length': rows[:, 1].astype(np.int64),
+            'start': rows[:, 2],
+            'end': rows[:, 3],
+            'sampling_rate': entry['sampling_rate']
+        }
+    return index
+
+
+def read_records(f, offsets, lengths) -> bytes:
+    """
+    Reads the given records, merging adjacent byte ranges into single reads.
+    """
+    order = np.argsort(offsets)
+    offsets, lengths = np.asarray(offsets)[order], np.asarray(lengths)[order]
+    chunks = []
+    run_start, run_end = None, None
+    for offset, length in zip(offsets.tolist(), lengths.tolist()):
+        if run_start is not None and offset == run_end:
+            run_end += length
+            continue
+        if run_start is not None:
+            f.seek(run_start)
+            chunks.append(f.read(run_end - run_start))
+        run_start, run_end = offset, offset + length
+    if run_start is not None:
+        f.seek(run_start)
+        chunks.append(f.read(run_end - run_start))
+    return b''.join(chunks)
+
+
+def decode_records(data: bytes):
+    """解码一段miniSEED记录；同一通道的多个片段合并，缺失部分补0"""
+    stream = read(io.BytesIO(data), format='MSEED')
+    stream.merge(method=1, fill_value=0)
+    return stream
+
+
+def window_records(entry: dict, p_arrival: float, pre: float, post: float):
+    """
+    Sample range [i0, i1] of the window around p_arrival (POSIX seconds), counted from the
+    channel's first sample, and the mask of records overlapping it. Like read_sac_window,
+    one extra sample is kept on each side.
+    :return: (i0, i1, mask)，窗口在记录之外时返回 None
+    """
+    first = entry['start'][0]
+    delta = 1.0 / entry['sampling_rate']
+    last = int(round((entry['end'][-1] - first) / delta))
+    p_rel = p_arrival - first
+
+    i0 = max(0, int(math.floor((p_rel - pre) / delta)) - 1)
+    i1 = min(last, int(math.ceil((p_rel + post) / delta)) + 1)
+    if i1 < i0:
+        return None
+
+    t0 = first + i0 * delta - delta / 2
+    t1 = first + i1 * delta + delta / 2
+    mask = (entry['end'] >= t0) & (entry['start'] <= t1)
+    if not mask.any():
+        return None
+    return i0, i1, mask
+
+
+def cut_window(trace, entry: dict, i0: int, i1: int):
+    """
+    Trims a decoded trace to samples [i0, i1] of its channel and sets stats.window_offset.
+    """
+    first = entry['start'][0]
+    delta = 1.0 / entry['sampling_rate']
+    trace.trim(UTCDateTime(first + i0 * delta), UTCDateTime(first + i1 * delta), nearest_sample=True)
+    if trace.stats.npts == 0:
+        return None
+    trace.stats.window_offset = round((trace.stats.starttime.timestamp - first) / delta) * delta
+    return trace
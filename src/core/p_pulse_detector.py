@@ -1,11 +1,71 @@
 import numpy as np
 from scipy.signal import find_peaks
 from obspy.core.trace import Trace
+from obspy.core.stream import Stream
+
+from core.detector_cache import MISS
+from core.pick_store import HORIZONTAL_PREFIXES, COMPONENT_PICK_FIELDS
+from utils.hashing import data_fingerprint, make_key
+
+# 检测前预处理的数据段：检测窗口两侧各加最低截止频率的 PREPROCESS_PAD_PERIODS 个周期，
+# 滤波器的边缘效应落在填充段内
+PREPROCESS_PAD_PERIODS = 3
+
+
+def flatten_3c(results_3c):
+    """
+    将 detect_pulse_3c 的结果转换为扁平的拾取字典：Z分量结果作为主拾取，
+    两个水平分量的脉冲参数以 'n_' / 'e_' 前缀保存，并附加矢量振幅；Z分量未检测到脉冲时返回None
+    """
+    if not results_3c:
+        return None
+    components = results_3c['components']
+    if components.get(0) is None:
+        return None
+    picks = dict(components[0])
+    picks['vector_peak_amplitude'] = results_3c['vector_peak_amplitude']
+    picks['vector_peak_time'] = results_3c['vector_peak_time']
+    for row, prefix in enumerate(HORIZONTAL_PREFIXES, start=1):
+        component = components.get(row)
+        if component is not None:
+            picks.update({f"{prefix}_{field}": component[field] for field in COMPONENT_PICK_FIELDS})
+    return picks
 
 class PPulseDetector:
-    def __init__(self, threshold_fraction=0.05, search_window=0.5):
+    def __init__(self, threshold_fraction=0.05, search_window=0.5, window_length=1.0, cache=None,
+                 preprocessor=None):
         self.threshold_fraction = threshold_fraction
         self.search_window = search_window
+        # 检测窗口长度：P波到时之后的秒数
+        self.window_length = window_length
+        # 可选的 DetectorCache，数据和参数都未变化时直接返回缓存结果
+        self.cache = cache
+        # 可选的 Preprocessor，检测前对波形做去趋势/尖灭/滤波
+        self.preprocessor = preprocessor
+
+    @property
+    def params(self):
+        """影响检测结果的参数元组，作为缓存键的一部分"""
+        spec = self.preprocessor.spec.key() if self.preprocessor else None
+        return (self.threshold_fraction, self.search_window, self.window_length, spec)
+
+    def preprocess_pad(self) -> float:
+        """检测前预处理时检测窗口两侧的填充长度（秒），没有预处理时为0"""
+        if self.preprocessor is None:
+            return 0.0
+        spec = self.preprocessor.spec
+        corner = spec.freqmin or spec.freqmax
+        return PREPROCESS_PAD_PERIODS / corner if corner else self.window_length
+
+    def preprocess_spans(self, traces, p_arrival) -> list:
+        """
+        The samples of each trace that detection preprocesses: [P - pad, P + window_length + pad],
+        with P relative to the first trace's start. The span depends only on P, so a full record
+        (GUI) and a P window read from disk (batch) give the same samples and the same filtered data.
+        """
+        t0 = traces[0].stats.starttime + p_arrival
+        pad = self.preprocess_pad()
+        return [tr.slice(starttime=t0 - pad, endtime=t0 + self.window_length + pad) for tr in traces]
 
     def detect_pulse(self, trace: Trace, p_arrival: float):
         """
@@ -17,15 +77,34 @@ class PPulseDetector:
         if not isinstance(trace, Trace) or p_arrival is None:
             return None
 
-        # 1. 数据窗口选择（P波后1秒）
-        t0 = trace.stats.starttime + p_arrival
-        t1 = t0 + 1.0
-        
-        win_trace = trace.copy().trim(starttime=t0, endtime=t1)
+        # 1. 数据窗口选择（P波后 window_length 秒）
+        ref_time = trace.stats.starttime
+        t0 = ref_time + p_arrival
+        t1 = t0 + self.window_length
+
+        if self.preprocessor is not None:
+            trace = self.preprocessor.process_traces(self.preprocess_spans([trace], p_arrival))[0]
         
-        window_time = win_trace.times(reftime=trace.stats.starttime)
-        window_seis = win_trace.data
+        # slice 只引用原始数据，不复制整条记录；窗口很短，检测计算在 float64 上进行
+        win_trace = trace.slice(starttime=t0, endtime=t1)
         
+        window_time = win_trace.times(reftime=ref_time)
+        window_seis = win_trace.data.astype(np.float64)
+
+        if self.cache is None:
+            return self._detect_window(window_seis, window_time, p_arrival)
+
+        # 以窗口数据内容、窗口位置和检测参数作为缓存键
+        key = make_key('detect_pulse', data_fingerprint(window_seis),
+                       window_time[0] if len(window_time) else None,
+                       trace.stats.delta, p_arrival, self.params)
+        results = self.cache.get(key)
+        if results is MISS:
+            results = self.cache.put(key, self._detect_window(window_seis, window_time, p_arrival))
+        return results
+
+    def _detect_window(self, window_seis, window_time, p_arrival):
+        """在已截取的P波窗口上运行检测步骤"""
         # 2. 峰值检测
         peaks_info = self.find_peaks_and_polarity(window_seis, window_time)
         if not peaks_info:
@@ -51,6 +130,175 @@ class PPulseDetector:
             'polarity': peaks_info['polarity']
         }
     
+    def detect_pulse_3c(self, stream: Stream, p_arrival: float):
+        """
+        三分量P脉冲检测
+        将三个分量的P波窗口组成 (3, n) 数组，一次向量化计算各分量脉冲参数及矢量振幅
+        :param stream: 包含三个分量（Z/N/E 或 Z/1/2）的Stream，顺序为 Z, N/1, E/2
+        :param p_arrival: 从SAC头文件读取的P波到时
+        :return: 包含各分量拾取结果及矢量振幅的字典；'components' 以行号为键（0: Z, 1: N/1, 2: E/2），
+                 不依赖各文件的通道名
+        """
+        if not isinstance(stream, Stream) or len(stream) < 3 or p_arrival is None:
+            return None
+
+        traces = list(stream)[:3]
+        ref_time = traces[0].stats.starttime
+        if self.preprocessor is not None:
+            traces = self.preprocessor.process_traces(self.preprocess_spans(traces, p_arrival))
+        t0 = ref_time + p_arrival
+        t1 = t0 + self.window_length
+
+        # slice 只引用原始数据，不复制整条记录
+        windows = [tr.slice(starttime=t0, endtime=t1) for tr in traces]
+        n = min(len(win.data) for win in windows)
+        if n < 3:
+            return None
+
+        window_time = windows[0].times(reftime=ref_time)[:n]
+        window_seis = np.vstack([win.data[:n] for win in windows]).astype(np.float64)
+
+        params = self.pulse_params_2d(window_seis, window_time, p_arrival)
+
+        components = {}
+        for row in range(len(traces)):
+            if not params['valid'][row]:
+                components[row] = None
+                continue
+            components[row] = {
+                'p_arrival': p_arrival,
+                'onset_time': float(params['onset_time'][row]),
+                'end_time': float(params['end_time'][row]),
+                'peak_amplitude': float(params['peak_amplitude'][row]),
+                'peak_time': float(params['peak_time'][row]),
+                'pulse_area': float(params['pulse_area'][row]),
+                'polarity': 'positive' if params['positive'][row] else 'negative'
+            }
+
+        # 矢量振幅
+        vector_amp = np.sqrt(np.sum(window_seis ** 2, axis=0))
+        vector_idx = int(np.argmax(vector_amp))
+
+        return {
+            'p_arrival': p_arrival,
+            'components': components,
+            'vector_peak_amplitude': float(vector_amp[vector_idx]),
+            'vector_peak_time': float(window_time[vector_idx])
+        }
+
+    def detect_station(self, stream: Stream, p_arrival: float, three_component=False):
+        """
+        一个台站的拾取结果（扁平字典）
+        三分量模式下只运行一次 detect_pulse_3c（见 flatten_3c），否则对Z分量运行 detect_pulse
+        :param stream: 按 Z, N/1, E/2 排序的Stream
+        """
+        if three_component and len(stream) >= 3:
+            return flatten_3c(self.detect_pulse_3c(stream, p_arrival))
+        z_trace = stream.select(component="Z")
+        return self.detect_pulse(z_trace[0], p_arrival) if z_trace else None
+
+    def pulse_params_2d(self, seis, time, p_arrival):
+        """
+        对 (m, n) 数组逐行计算主峰、起始点、过零点和脉冲面积，
+        规则与 find_peaks_and_polarity / detect_onset / detect_zero_crossing / calculate_pulse_area 相同。
+        """
+        m, n = seis.shape
+        rows = np.arange(m)
+        cols = np.arange(n)
+
+        # 1. 峰值检测：高于各行最大绝对值10%的第一个正/负局部极值
+        # 逐行使用 find_peaks（行数只有分量数），平台和肩部的处理与单分量检测一致
+        height = np.max(np.abs(seis), axis=1) * 0.1
+        first_pos = np.full(m, n)
+        first_neg = np.full(m, n)
+        for row in rows:
+            pos_peaks, _ = find_peaks(seis[row], height=height[row])
+            neg_peaks, _ = find_peaks(-seis[row], height=height[row])
+            if len(pos_peaks):
+                first_pos[row] = pos_peaks[0]
+            if len(neg_peaks):
+                first_neg[row] = neg_peaks[0]
+        has_pos = first_pos < n
+        has_neg = first_neg < n
+
+        valid = has_pos | has_neg
+        positive = first_pos < first_neg
+        peak_idx = np.minimum(np.where(positive, first_pos, first_neg), n - 1)
+        peak_amp = seis[rows, peak_idx]
+        peak_time = time[peak_idx]
+
+        # 2. 起始点：主峰之前最后一个低于阈值的点之后的一个点
+        onset_threshold = np.abs(peak_amp) * self.threshold_fraction
+        below = (np.abs(seis) < onset_threshold[:, None]) & (cols <= peak_idx[:, None])
+        has_below = below.any(axis=1)
+        last_below = n - 1 - np.argmax(below[:, ::-1], axis=1)
+        onset_time = np.where(has_below, time[np.minimum(last_below + 1, n - 1)], p_arrival)
+
+        # 3. 结束点：主峰之后第一个符号变化处线性插值得到的过零点
+        sign = np.sign(seis)
+        crossing = (sign[:, :-1] != sign[:, 1:]) & (cols[:-1] >= peak_idx[:, None])
+        has_crossing = crossing.any(axis=1)
+        i = np.argmax(crossing, axis=1)
+        y1, y2 = seis[rows, i], seis[rows, i + 1]
+        dy = np.where(y2 == y1, 1.0, y2 - y1)
+        t_zero = np.where(y2 == y1, time[i], time[i] - y1 * (time[i + 1] - time[i]) / dy)
+        end_time = np.where(has_crossing, t_zero, time[-1])
+
+        # 4. 脉冲面积：起始点到结束点之间的梯形积分
+        in_pulse = (time >= onset_time[:, None]) & (time <= end_time[:, None])
+        pairs = in_pulse[:, :-1] & in_pulse[:, 1:]
+        segments = 0.5 * (seis[:, :-1] + seis[:, 1:]) * np.diff(time)
+        pulse_area = np.sum(np.where(pairs, segments, 0.0), axis=1)
+
+        return {
+            'valid': valid,
+            'positive': positive,
+            'peak_idx': peak_idx,
+            'peak_amplitude': peak_amp,
+            'peak_time': peak_time,
+            'onset_time': onset_time,
+            'end_time': end_time,
+            'pulse_area': pulse_area
+        }
+
+    def detect_thresholds(self, seis, time, p_arrival, thresholds):
+        """
+        在同一个P波窗口上一次评估多个 threshold_fraction
+        主峰和过零点与阈值无关，只计算一次；起始点对所有阈值向量化计算，脉冲面积每个不同的起始点计算一次
+        :param thresholds: threshold_fraction 数组
+        :return: 包含各阈值结果数组的字典，未检测到峰值时返回None
+        """
+        peaks_info = self.find_peaks_and_polarity(seis, time)
+        if not peaks_info:
+            return None
+
+        thresholds = np.asarray(thresholds, dtype=np.float64)
+        end_time = self.detect_zero_crossing(seis, time, peaks_info)
+
+        # 起始点：主峰之前最后一个低于阈值的点之后的一个点，找不到时为P波到时
+        peak_idx = peaks_info['main_peak_idx']
+        onset_thresholds = abs(peaks_info['main_peak_amp']) * thresholds
+        below = np.abs(seis[:peak_idx + 1])[None, :] < onset_thresholds[:, None]
+        has_below = below.any(axis=1)
+        last_below = peak_idx - np.argmax(below[:, ::-1], axis=1)
+        onset_time = np.where(has_below, time[np.minimum(last_below + 1, len(time) - 1)], p_arrival)
+
+        # 脉冲面积：不同阈值往往得到相同的起始点，每个不同的起始点只用 calculate_pulse_area 计算一次，
+        # 与 detect_pulse 的结果逐位一致
+        unique_onsets, inverse = np.unique(onset_time, return_inverse=True)
+        areas = np.array([self.calculate_pulse_area(seis, time, onset, end_time) for onset in unique_onsets])
+        pulse_area = areas[inverse]
+
+        return {
+            'threshold_fraction': thresholds,
+            'onset_time': onset_time,
+            'end_time': end_time,
+            'peak_amplitude': peaks_info['main_peak_amp'],
+            'peak_time': peaks_info['main_peak_time'],
+            'pulse_area': pulse_area,
+            'polarity': peaks_info['polarity']
+        }
+
     def find_peaks_and_polarity(self, seis, time):
         """检测正负峰值并确定极性"""
         if len(seis) == 0:
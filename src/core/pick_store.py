@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+拾取结果的CSV读写
+"""
+
+import csv
+from obspy import UTCDateTime
+
+# 三分量模式下两个水平分量（按 N/1, E/2 排序）的脉冲参数，字段名加前缀 'n_' / 'e_'
+HORIZONTAL_PREFIXES = ('n', 'e')
+COMPONENT_PICK_FIELDS = ['polarity', 'onset_time', 'end_time', 'peak_amplitude', 'peak_time', 'pulse_area']
+PICK_FIELDS = (['p_arrival', 'polarity', 'onset_time', 'end_time', 'peak_amplitude',
+                'peak_time', 'pulse_area', 'vector_peak_amplitude', 'vector_peak_time'] +
+               [f"{prefix}_{field}" for prefix in HORIZONTAL_PREFIXES for field in COMPONENT_PICK_FIELDS])
+CSV_HEADER = ['event_id', 'station_id'] + PICK_FIELDS
+
+
+def component_picks(picks: dict, order: int) -> dict:
+    """
+    Picks of one component in unprefixed form: order 0 (Z) gives picks itself,
+    1 and 2 (N/1, E/2) the corresponding horizontal fields plus the shared p_arrival.
+    Stations without horizontal results give picks for every component.
+    """
+    if not 1 <= order <= len(HORIZONTAL_PREFIXES):
+        return picks
+    prefix = HORIZONTAL_PREFIXES[order - 1]
+    fields = {field: picks[f"{prefix}_{field}"] for field in COMPONENT_PICK_FIELDS if f"{prefix}_{field}" in picks}
+    if not fields:
+        return picks
+    fields['p_arrival'] = picks.get('p_arrival')
+    return fields
+
+
+def merge_component_picks(per_component: dict) -> dict:
+    """
+    Inverse of component_picks: { order: unprefixed picks of that component } ->
+    Z picks with the horizontal fields added under the 'n_' / 'e_' prefixes.
+    Horizontal picks identical to the Z picks were written for a station without
+    horizontal results (component_picks copies the Z picks) and are not added.
+    """
+    picks = dict(per_component.get(0) or {})
+    if not picks:
+        return picks
+    for order, prefix in enumerate(HORIZONTAL_PREFIXES, start=1):
+        fields = per_component.get(order)
+        if not fields or all(fields.get(field) == picks.get(field) for field in COMPONENT_PICK_FIELDS):
+            continue
+        for field in COMPONENT_PICK_FIELDS:
+            if field in fields:
+                picks[f"{prefix}_{field}"] = fields[field]
+    return picks
+
+
+def write_picks_csv(file_path, station_picks: dict, extra_fields=()):
+    """
+    Writes { (event_id, station_id): picks } to a CSV file, sorted by station key.
+    """
+    header = CSV_HEADER + list(extra_fields)
+    with open(file_path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=header, extrasaction='ignore')
+        writer.writeheader()
+        for (event_id, station_id), picks in sorted(station_picks.items()):
+            row = {'event_id': event_id, 'station_id': station_id}
+            row.update(picks)
+            writer.writerow(row)
+
+
+def parse_pick_row(row: dict) -> dict:
+    """
+    Converts one CSV row to a picks dict: numeric fields to float, empty fields dropped.
+    """
+    picks = {}
+    for key, value in row.items():
+        if key in ('event_id', 'station_id') or value in (None, ''):
+            continue
+        if key == 'polarity':
+            picks[key] = value
+            continue
+        try:
+            picks[key] = float(value)
+        except ValueError:
+            picks[key] = value
+    return picks
+
+
+def read_picks_csv(file_path) -> dict:
+    """
+    Reads a CSV written by write_picks_csv into { (event_id, station_id): picks }.
+    """
+    station_picks = {}
+    with open(file_path, 'r', newline='') as f:
+        for row in csv.DictReader(f):
+            station_picks[(row['event_id'], row['station_id'])] = parse_pick_row(row)
+    return station_picks
+
+
+def read_arrivals_csv(file_path) -> dict:
+    """
+    Reads external P arrivals (columns event_id, station_id, p_time as ISO-8601 UTC)
+    into { (event_id, station_id): UTCDateTime }, for formats without header picks.
+    """
+    arrivals = {}
+    with open(file_path, 'r', newline='') as f:
+        for row in csv.DictReader(f):
+            arrivals[(row['event_id'], row['station_id'])] = UTCDateTime(row['p_time'])
+    return arrivals
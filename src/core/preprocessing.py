@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+检测前的波形预处理：去均值、去线性趋势、两端尖灭、SOS零相位带通滤波
+相同长度和采样率的多道数据作为一个二维数组一次处理，结果按（数据身份, 滤波参数）缓存，
+缓存的每道数据为独立的 float32 数组，并登记到全局内存预算
+"""
+
+import weakref
+from collections import OrderedDict
+from functools import lru_cache, partial
+import numpy as np
+from scipy.signal import butter, sosfiltfilt
+from obspy.core.trace import Trace
+
+from utils.hashing import data_fingerprint
+from core.memory_budget import memory_budget, to_float32
+
+
+class PreprocessSpec:
+    def __init__(self, demean=True, detrend=True, taper=0.05, freqmin=1.0, freqmax=None, corners=4):
+        """
+        :param taper: 每端尖灭长度占总长度的比例（Hann窗），0 表示不尖灭
+        :param freqmin: 带通下限 (Hz)，None 表示不做高通
+        :param freqmax: 带通上限 (Hz)，None 表示不做低通
+        :param corners: Butterworth 滤波器阶数
+        """
+        self.demean = demean
+        self.detrend = detrend
+        self.taper = taper
+        self.freqmin = freqmin
+        self.freqmax = freqmax
+        self.corners = corners
+
+    def key(self):
+        """滤波参数元组，作为缓存键的一部分"""
+        return (self.demean, self.detrend, self.taper, self.freqmin, self.freqmax, self.corners)
+
+    def __repr__(self):
+        return f"PreprocessSpec{self.key()}"
+
+
+@lru_cache(maxsize=64)
+def design_sos(freqmin, freqmax, corners, sampling_rate):
+    """
+    Butterworth SOS coefficients for the band, or None if no filtering is requested.
+    Frequencies at or above Nyquist are dropped.
+    """
+    nyquist = 0.5 * sampling_rate
+    if freqmax is not None and freqmax >= nyquist:
+        freqmax = None
+    if freqmin is not None and freqmax is not None:
+        return butter(corners, [freqmin, freqmax], btype='bandpass', fs=sampling_rate, output='sos')
+    if freqmin is not None:
+        return butter(corners, freqmin, btype='highpass', fs=sampling_rate, output='sos')
+    if freqmax is not None:
+        return butter(corners, freqmax, btype='lowpass', fs=sampling_rate, output='sos')
+    return None
+
+
+def preprocess_array(data, sampling_rate, spec: PreprocessSpec):
+    """
+    Applies spec to a 2-D array (one trace per row) in a single vectorized pass.
+    :return: float64 的二维数组
+    """
+    data = np.atleast_2d(np.asarray(data, dtype=np.float64))
+    n = data.shape[-1]
+    if n == 0:
+        return data.copy()
+
+    if spec.detrend and n > 1:
+        # 逐行最小二乘直线拟合（同时去除均值）
+        t = np.arange(n, dtype=np.float64) - (n - 1) / 2.0
+        mean = data.mean(axis=-1, keepdims=True)
+        slope = (data * t).sum(axis=-1, keepdims=True) / np.dot(t, t)
+        data = data - mean - slope * t
+    elif spec.demean:
+        data = data - data.mean(axis=-1, keepdims=True)
+    else:
+        data = data.copy()
+
+    if spec.taper:
+        m = int(n * spec.taper)
+        if m > 0:
+            ramp = 0.5 * (1.0 - np.cos(np.pi * np.arange(m) / m))
+            data[:, :m] *= ramp
+            data[:, n - m:] *= ramp[::-1]
+
+    sos = design_sos(spec.freqmin, spec.freqmax, spec.corners, float(sampling_rate))
+    if sos is not None and n > 1:
+        padlen = min(3 * (2 * len(sos) + 1), n - 1)
+        data = sosfiltfilt(sos, data, axis=-1, padlen=padlen)
+
+    return data
+
+
+class Preprocessor:
+    def __init__(self, spec=None, max_entries=1024):
+        self.spec = spec or PreprocessSpec()
+        self.max_entries = max_entries
+        self._cache = OrderedDict()
+        self._budget_owner = object()
+        weakref.finalize(self, memory_budget.release_owner, self._budget_owner)
+
+    def cache_key(self, trace: Trace):
+        """（数据身份, 滤波参数）"""
+        return (data_fingerprint(trace.data), trace.stats.sampling_rate, self.spec.key())
+
+    def process_trace(self, trace: Trace) -> Trace:
+        """
+        Returns a preprocessed copy of trace (header copied, data filtered), from cache if possible.
+        """
+        return self.process_traces([trace])[0]
+
+    def process_traces(self, traces) -> list:
+        """
+        Preprocesses many traces. Cache misses with the same sampling rate and length
+        are stacked into one 2-D array and filtered together.
+        """
+        keys = [self.cache_key(tr) for tr in traces]
+        results = [None] * len(traces)
+
+        groups = {}
+        for i, (tr, key) in enumerate(zip(traces, keys)):
+            cached = self._cache.get(key)
+            if cached is not None:
+                results[i] = cached
+                try:
+                    self._cache.move_to_end(key)
+                except KeyError:
+                    pass
+                memory_budget.touch((self._budget_owner, key))
+            else:
+                groups.setdefault((tr.stats.sampling_rate, len(tr.data)), []).append(i)
+
+        for (sampling_rate, _), indices in groups.items():
+            batch = np.vstack([traces[i].data for i in indices])
+            filtered = preprocess_array(batch, sampling_rate, self.spec)
+            for row, i in enumerate(indices):
+                # 每道单独保存，缓存条目被释放时不会因其他行而保留整个二维数组；
+                # 缓存数组在多个Trace之间共享，设为只读以防被原地修改
+                data = to_float32(filtered[row])
+                if data.base is not None:
+                    data = data.copy()
+                data.flags.writeable = False
+                results[i] = data
+                self._remember(keys[i], data)
+
+        return [Trace(data=data, header=tr.stats.copy()) for tr, data in zip(traces, results)]
+
+    def clear(self):
+        self._cache.clear()
+        memory_budget.release_owner(self._budget_owner)
+
+    def _remember(self, key, data):
+        self._cache[key] = data
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_entries:
+            evicted, _ = self._cache.popitem(last=False)
+            memory_budget.release((self._budget_owner, evicted))
+        memory_budget.register((self._budget_owner, key), data.nbytes, 'preprocessed',
+                               on_evict=partial(self._cache.pop, key, None))
@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+全目录数据质量指标（P波前后信噪比、削波比例、峰值振幅、数据缺失），用于筛选台站
+每个台站只读取P波附近的数据窗口，一批台站的窗口组成二维数组后一次向量化计算
+"""
+
+import csv
+import math
+import numpy as np
+
+from core.data_loader import DataLoader, get_p_arrival_time
+
+QUALITY_FIELDS = ['snr', 'clip_fraction', 'peak_amplitude', 'gap_fraction']
+QUALITY_HEADER = ['event_id', 'station_id'] + QUALITY_FIELDS
+
+
+def quality_metrics(data2d, valid, p_index, expected_npts, clip_tolerance=1e-3, min_flat_samples=10) -> dict:
+    """
+    Quality metrics for a batch of P windows (one row per station).
+    :param data2d: (n_stations, n_samples)，较短的窗口在末尾补齐（补齐部分由 valid 标记为 False）
+    :param valid: 与 data2d 同形状的布尔数组，True 为实际数据
+    :param p_index: 每行P波到时所在的采样点序号；此前为噪声段，此后为信号段
+    :param expected_npts: 窗口完整时每行应有的采样点数，不足部分（记录边界截断）计为缺失
+    :return: {指标名: 长度为 n_stations 的数组}
+    - snr: 信号段与噪声段（均减去噪声段均值）的RMS之比，噪声为零或缺失时为 NaN
+    - clip_fraction: 绝对值达到窗口最大绝对值 (1 - clip_tolerance) 倍的采样点比例，削波时明显偏大
+    - peak_amplitude: 信号段去均值后的最大绝对振幅
+    - gap_fraction: 缺失采样点（截断、NaN、不少于 min_flat_samples 个点的恒定值段）占 expected_npts 的比例
+    """
+    data2d = np.asarray(data2d, dtype=np.float64)
+    n_rows, n_cols = data2d.shape
+    expected_npts = np.broadcast_to(np.asarray(expected_npts), (n_rows,))
+    nan = np.isnan(data2d)
+    valid = valid & ~nan
+    # NaN 视为0，连续的NaN会成为恒定值段而计入缺失
+    data2d = np.where(valid, data2d, 0.0)
+
+    cols = np.arange(n_cols)
+    noise_mask = valid & (cols < np.asarray(p_index)[:, None])
+    signal_mask = valid & ~noise_mask
+
+    n_noise = noise_mask.sum(axis=1)
+    n_signal = signal_mask.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        noise_mean = (data2d * noise_mask).sum(axis=1) / n_noise
+        centered = data2d - np.nan_to_num(noise_mean)[:, None]
+        noise_rms = np.sqrt((centered ** 2 * noise_mask).sum(axis=1) / n_noise)
+        signal_rms = np.sqrt((centered ** 2 * signal_mask).sum(axis=1) / n_signal)
+        snr = np.where(noise_rms > 0, signal_rms / noise_rms, np.nan)
+
+    peak_amplitude = np.abs(centered * signal_mask).max(axis=1, initial=0.0)
+
+    abs_data = np.abs(data2d) * valid
+    window_peak = abs_data.max(axis=1, initial=0.0)
+    n_valid = valid.sum(axis=1)
+    at_peak = valid & (abs_data >= (window_peak * (1.0 - clip_tolerance))[:, None]) & (window_peak[:, None] > 0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        clip_fraction = at_peak.sum(axis=1) / n_valid
+
+    # 恒定值段：相邻差为0的连续区间，按行展开后统一求游程
+    flat = (np.diff(data2d, axis=1) == 0) & valid[:, 1:] & valid[:, :-1]
+    edges = np.diff(np.pad(flat, ((0, 0), (1, 1))).astype(np.int8), axis=1)
+    starts = np.argwhere(edges == 1)
+    ends = np.argwhere(edges == -1)
+    run_samples = ends[:, 1] - starts[:, 1] + 1
+    long_runs = run_samples >= min_flat_samples
+    flat_samples = np.zeros(n_rows)
+    np.add.at(flat_samples, starts[long_runs, 0], run_samples[long_runs])
+
+    missing = np.maximum(expected_npts - n_valid, 0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        gap_fraction = np.minimum((flat_samples + missing) / expected_npts, 1.0)
+
+    return {
+        'snr': snr,
+        'clip_fraction': clip_fraction,
+        'peak_amplitude': peak_amplitude,
+        'gap_fraction': gap_fraction
+    }
+
+
+def compute_quality(loader: DataLoader, keys=None, noise=2.0, signal=1.0, batch_size=512, progress=None) -> dict:
+    """
+    Quality metrics of the Z component around P for every station (or the given keys).
+    Noise window: [p - noise, p); signal window: [p, p + signal].
+    :param progress: 可选回调 progress(done, total)
+    :return: { (event_id, station_id): {指标名: float} }，没有P波到时或读取失败的台站不包含在内
+    """
+    if keys is None:
+        keys = [(event_id, station_id)
+                for event_id in sorted(loader.events)
+                for station_id in sorted(loader.events[event_id])]
+    keys = list(keys)
+
+    index = {}
+    for start in range(0, len(keys), batch_size):
+        batch_keys = keys[start:start + batch_size]
+        streams = loader.load_windows(batch_keys, pre=noise, post=signal, z_only=True)
+
+        rows = []
+        for key in batch_keys:
+            z_trace = streams[key].select(component="Z") if streams[key] else None
+            if not z_trace:
+                continue
+            trace = z_trace[0]
+            p_arrival = get_p_arrival_time(trace)
+            if p_arrival == -12345.0:
+                continue
+            delta = trace.stats.delta
+            rows.append((key, trace.data, int(round(p_arrival / delta)),
+                         int(round((noise + signal) / delta)) + 1))
+
+        if rows:
+            n_cols = max(len(data) for _, data, _, _ in rows)
+            data2d = np.zeros((len(rows), n_cols))
+            valid = np.zeros((len(rows), n_cols), dtype=bool)
+            for i, (_, data, _, _) in enumerate(rows):
+                data2d[i, :len(data)] = data
+                valid[i, :len(data)] = True
+            metrics = quality_metrics(data2d, valid,
+                                      np.array([p for _, _, p, _ in rows]),
+                                      np.array([n for _, _, _, n in rows]))
+            for i, (key, _, _, _) in enumerate(rows):
+                index[key] = {name: float(values[i]) for name, values in metrics.items()}
+
+        if progress:
+            progress(min(start + batch_size, len(keys)), len(keys))
+    return index
+
+
+def passes_quality(metrics, min_snr=None, max_clip=None, max_gap=None) -> bool:
+    """
+    Whether a station's metrics meet the thresholds; stations without metrics
+    (or with an undefined SNR) are never rejected.
+    """
+    if not metrics:
+        return True
+    snr = metrics.get('snr')
+    if min_snr is not None and snr is not None and not math.isnan(snr) and snr < min_snr:
+        return False
+    if max_clip is not None and metrics.get('clip_fraction', 0.0) > max_clip:
+        return False
+    if max_gap is not None and metrics.get('gap_fraction', 0.0) > max_gap:
+        return False
+    return True
+
+
+def write_quality_csv(path, index: dict):
+    """
+    Writes { (event_id, station_id): metrics } to a CSV file, sorted by station key.
+    """
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=QUALITY_HEADER, extrasaction='ignore')
+        writer.writeheader()
+        for (event_id, station_id), metrics in sorted(index.items()):
+            row = {'event_id': event_id, 'station_id': station_id}
+            row.update(metrics)
+            writer.writerow(row)
+
+
+def read_quality_csv(path) -> dict:
+    index = {}
+    with open(path, 'r', newline='') as f:
+        for row in csv.DictReader(f):
+            index[(row['event_id'], row['station_id'])] = {
+                name: float(row[name]) for name in QUALITY_FIELDS if row.get(name) not in (None, '')}
+    return index
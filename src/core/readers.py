@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+波形读取后端：DataLoader 按文件名为每个文件选择一个后端，扫描、完整读取和P波窗口读取都经由后端完成
+- SacBackend: SAC文件，按文件名建立索引（不读文件），窗口按头段计算字节范围直接读取
+- MseedBackend: miniSEED文件（可为包含多台站多通道的日文件），按记录头段建立索引，
+  窗口只读取和解码重叠的记录；P波到时由外部到时表提供
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from obspy import UTCDateTime
+
+from core.archive import open_source, split_member_path
+from core.sac_io import read_sac_window, read_waveform, read_sac_header, header_picks
+from core.mseed_io import index_records, read_records, decode_records, window_records, cut_window
+
+
+class ReaderBackend:
+    """
+    读取后端接口
+    读取请求 request 为 (path, station_id, component, p_arrival)，p_arrival 为外部提供的
+    P波绝对到时（UTCDateTime，可为None；SAC文件使用头段中的到时）
+    """
+    name = None
+
+    def matches(self, file_name) -> bool:
+        """Whether this backend reads the given file name."""
+        raise NotImplementedError
+
+    def index_file(self, path, file_name) -> list:
+        """
+        (station_id, component) pairs contained in a file, for DataLoader.scan_files.
+        """
+        raise NotImplementedError
+
+    def read(self, request):
+        """Reads the full record of one component as a Trace."""
+        raise NotImplementedError
+
+    def read_window(self, request, pre, post):
+        """
+        Reads the samples from p_arrival - pre to p_arrival + post as a Trace whose
+        stats.window_offset is its start relative to the full record, or None.
+        """
+        raise NotImplementedError
+
+    def read_windows(self, requests, pre, post, workers=8) -> list:
+        """
+        Reads many windows in one call; failed reads give None.
+        The default implementation overlaps single reads in a thread pool.
+        """
+        def read_one(request):
+            try:
+                return self.read_window(request, pre, post)
+            except Exception as e:
+                print(f"Error reading {request[0]}: {e}")
+                return None
+
+        requests = list(requests)
+        if workers <= 1 or len(requests) <= 1:
+            return [read_one(request) for request in requests]
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(read_one, requests))
+
+    def header_picks(self, path) -> dict:
+        """Picks stored in the file itself, if the format supports it."""
+        return {}
+
+
+class SacBackend(ReaderBackend):
+    """SAC文件，文件名形如 'NET.STA.COMP.SAC' 或 'NET.STA.COMP'"""
+    name = 'sac'
+
+    @staticmethod
+    def _name_parts(file_name):
+        if file_name.upper().endswith('.SAC'):
+            file_name = file_name[:-4]
+        return file_name.split('.')
+
+    def matches(self, file_name) -> bool:
+        return len(self._name_parts(file_name)) >= 3
+
+    def index_file(self, path, file_name) -> list:
+        parts = self._name_parts(file_name)
+        return [(".".join(parts[:-1]), parts[-1])]
+
+    def read(self, request):
+        return read_waveform(request[0])[0]
+
+    def read_window(self, request, pre, post):
+        return read_sac_window(request[0], pre, post)
+
+    def header_picks(self, path) -> dict:
+        return header_picks(read_sac_header(path))
+
+
+def _seed_id(station_id, component):
+    """DataLoader 中的 (台站, 分量) -> SEED标识 'NET.STA.LOC.CHA'"""
+    location, _, channel = component.rpartition('.')
+    return f"{station_id}.{location}.{channel}"
+
+
+class MseedBackend(ReaderBackend):
+    """
+    miniSEED文件：台站为 'NET.STA'，分量为 'LOC.CHA'（位置码为空时为 'CHA'）
+    每个文件的记录索引在扫描时建立并保存在后端中；同一事件中一个通道只对应一个文件
+    """
+    name = 'mseed'
+
+    def __init__(self, extensions=('.mseed', '.miniseed', '.msd', '.ms')):
+        self.extensions = tuple(ext.lower() for ext in extensions)
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def matches(self, file_name) -> bool:
+        return file_name.lower().endswith(self.extensions)
+
+    def record_index(self, path) -> dict:
+        """{seed_id: 记录索引}，每个文件只扫描一次"""
+        with self._lock:
+            if path in self._indexes:
+                return self._indexes[path]
+        with open_source(path) as f:
+            index = index_records(f)
+        with self._lock:
+            self._indexes[path] = index
+        return index
+
+    def index_file(self, path, file_name) -> list:
+        pairs = []
+        for seed_id in self.record_index(path):
+            network, station, location, channel = seed_id.split('.')
+            pairs.append((f"{network}.{station}", f"{location}.{channel}" if location else channel))
+        return pairs
+
+    def _entry(self, request):
+        path, station_id, component, _ = request
+        return self.record_index(path).get(_seed_id(station_id, component))
+
+    def read(self, request):
+        path, _, _, p_arrival = request
+        entry = self._entry(request)
+        if entry is None:
+            return None
+        with open_source(path) as f:
+            stream = decode_records(read_records(f, entry['offset'], entry['length']))
+        if not stream:
+            return None
+        trace = stream[0]
+        if p_arrival is not None:
+            trace.stats.p_arrival = UTCDateTime(p_arrival)
+        return trace
+
+    def read_window(self, request, pre, post):
+        return self.read_windows([request], pre, post, workers=1)[0]
+
+    def read_windows(self, requests, pre, post, workers=8) -> list:
+        """
+        Windows are grouped by file: the overlapping records of all requested channels
+        of a file are read (adjacent records in one read) and decoded together.
+        """
+        requests = list(requests)
+        by_path = {}
+        for i, request in enumerate(requests):
+            by_path.setdefault(request[0], []).append(i)
+
+        results = [None] * len(requests)
+
+        def read_file(path):
+            try:
+                traces = self._read_file_windows(path, [requests[i] for i in by_path[path]], pre, post)
+            except Exception as e:
+                print(f"Error reading {path}: {e}")
+                return
+            for i, trace in zip(by_path[path], traces):
+                results[i] = trace
+
+        if workers <= 1 or len(by_path) <= 1:
+            for path in by_path:
+                read_file(path)
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                list(pool.map(read_file, by_path))
+        return results
+
+    def _read_file_windows(self, path, requests, pre, post) -> list:
+        results = [None] * len(requests)
+        selections = []
+        for position, request in enumerate(requests):
+            entry = self._entry(request)
+            p_arrival = request[3]
+            if entry is None or p_arrival is None:
+                continue
+            window = window_records(entry, UTCDateTime(p_arrival).timestamp, pre, post)
+            if window is not None:
+                selections.append((position, request, entry, window))
+        if not selections:
+            return results
+
+        # 所有请求通道的重叠记录 {偏移: 长度}，同一记录只读一次
+        records = {}
+        for _, _, entry, (_, _, mask) in selections:
+            records.update(zip(entry['offset'][mask].tolist(), entry['length'][mask].tolist()))
+        with open_source(path) as f:
+            stream = decode_records(read_records(f, list(records), list(records.values())))
+
+        for position, request, entry, (i0, i1, _) in selections:
+            selected = stream.select(id=_seed_id(request[1], request[2]))
+            if not selected:
+                continue
+            trace = cut_window(selected[0].copy(), entry, i0, i1)
+            if trace is not None:
+                trace.stats.p_arrival = UTCDateTime(request[3])
+            results[position] = trace
+        return results
+
+
+def default_backends() -> list:
+    """miniSEED按扩展名优先识别，其余按SAC命名规则识别"""
+    return [MseedBackend(), SacBackend()]
+
+
+def file_name_of(path) -> str:
+    """文件名（归档成员取成员名的最后一段）"""
+    return os.path.basename(split_member_path(path)[1])
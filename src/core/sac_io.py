@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+SAC二进制文件的底层读取：只读头段，或按字节范围只读取数据段的一部分
+"""
+
+import io
+import math
+import numpy as np
+from obspy import read
+from obspy.core.trace import Trace
+from obspy.core.stream import Stream
+from obspy.io.sac.arrayio import read_sac, header_arrays_to_dict
+from obspy.io.sac.util import sac_to_obspy_header
+
+from core.archive import open_source, split_member_path
+
+# SAC头段固定为 70个float + 40个int + 24个8字节字符串
+SAC_HEADER_SIZE = 632
+SAC_NULL = -12345.0
+# 写回SAC文件的拾取结果所用的头段字段（时间为相对记录起点的秒数）
+SAC_PICK_HEADERS = {
+    't4': 'p_arrival',
+    't5': 'onset_time',
+    't6': 'end_time',
+    't7': 'peak_time',
+    'user0': 'peak_amplitude',
+    'user1': 'pulse_area',
+}
+
+
+def read_sac_header(source) -> dict:
+    """
+    Reads only the 632-byte SAC header and returns it as a dict (null values omitted).
+    The byte order of the data section is stored under the '_byteorder' key.
+    :param source: 文件路径、归档成员路径或以 'rb' 打开的文件对象
+    """
+    if isinstance(source, str):
+        with open_source(source) as f:
+            return read_sac_header(f)
+
+    hf, hi, hs, _ = read_sac(source, headonly=True)
+    header = header_arrays_to_dict(hf, hi, hs)
+    header['_byteorder'] = hi.dtype.byteorder
+    return header
+
+
+def header_p_arrival(header: dict) -> float:
+    """
+    P-wave arrival from a SAC header dict, relative to the record start (b).
+    Priority: t1 > t3, same as get_p_arrival_time.
+    """
+    b = header.get('b', 0.0)
+    for key in ('t1', 't3'):
+        if key in header and header[key] != SAC_NULL:
+            return header[key] - b
+    return SAC_NULL
+
+
+def header_picks(header: dict) -> dict:
+    """
+    Picks previously written to the SAC header (see SAC_PICK_HEADERS).
+    The polarity is not stored in the header; it is derived from the sign of peak_amplitude.
+    """
+    picks = {pick_key: float(header[sac_key]) for sac_key, pick_key in SAC_PICK_HEADERS.items()
+             if sac_key in header and header[sac_key] != SAC_NULL}
+    if picks.get('peak_amplitude'):
+        picks['polarity'] = 'positive' if picks['peak_amplitude'] > 0 else 'negative'
+    return picks
+
+
+def read_sac_window(source, pre: float, post: float):
+    """
+    Reads the samples in [p_arrival - pre, p_arrival + post] from a SAC file.
+    Only the header and the required slice of the data section are read.
+    :param source: 文件路径、归档成员路径或以 'rb' 打开的可 seek 文件对象
+    :return: Trace（头段b已平移到窗口起点，stats.window_offset为窗口相对原记录起点的秒数），
+             无有效P波到时或窗口在记录之外时返回None
+    """
+    if isinstance(source, str):
+        with open_source(source) as f:
+            return read_sac_window(f, pre, post)
+
+    header = read_sac_header(source)
+    byteorder = header.pop('_byteorder')
+
+    p_arrival = header_p_arrival(header)
+    if p_arrival == SAC_NULL:
+        return None
+
+    delta = float(header['delta'])
+    npts = int(header['npts'])
+
+    # 多读一个采样点，保证后续按最近采样点裁剪时不会缺点
+    i0 = max(0, int(math.floor((p_arrival - pre) / delta)) - 1)
+    i1 = min(npts - 1, int(math.ceil((p_arrival + post) / delta)) + 1)
+    if i1 < i0:
+        return None
+
+    source.seek(SAC_HEADER_SIZE + 4 * i0)
+    data = np.frombuffer(source.read(4 * (i1 - i0 + 1)), dtype=byteorder + 'f4').astype(np.float32)
+
+    header['b'] = header.get('b', 0.0) + i0 * delta
+    header['npts'] = len(data)
+    header['e'] = header['b'] + (len(data) - 1) * delta
+
+    trace = Trace(data=data, header=sac_to_obspy_header(header))
+    trace.stats.window_offset = i0 * trace.stats.delta
+    return trace
+
+
+def is_archive_member(path) -> bool:
+    return split_member_path(path)[0] is not None
+
+
+def read_waveform(path) -> Stream:
+    """
+    Reads a complete waveform file (plain path or archive member) with ObsPy.
+    """
+    if not is_archive_member(path):
+        return read(path)
+    with open_source(path) as f:
+        return read(io.BytesIO(f.read()))
@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+多机/多进程分片批量拾取：
+- 按 (事件, 台站) 的稳定哈希确定性分片（--shard i/N），或从共享存储上的SQLite工作队列按块领取
+- 每个分片的结果逐批追加写入自己的CSV文件，中断后重新运行时跳过已完成的台站
+- 最后将所有分片文件合并为一张拾取表
+"""
+
+import csv
+import json
+import os
+import sqlite3
+import time
+import zlib
+
+from core.batch_picker import BatchPicker
+from core.pick_store import CSV_HEADER, read_picks_csv, write_picks_csv
+
+
+def parse_shard(text: str):
+    """
+    Parses 'i/N' into (i, N) with 0 <= i < N.
+    """
+    try:
+        index, count = (int(v) for v in text.split('/'))
+    except ValueError:
+        raise ValueError(f"invalid shard '{text}', expected 'i/N'")
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"invalid shard '{text}', expected 0 <= i < N")
+    return index, count
+
+
+def shard_of(event_id, station_id, count) -> int:
+    """
+    Shard of a station: CRC32 of 'event/station' modulo count.
+    Stable across machines, Python versions and runs (unlike hash()).
+    """
+    return zlib.crc32(f"{event_id}/{station_id}".encode('utf-8')) % count
+
+
+def shard_keys(keys, index, count) -> list:
+    return [key for key in keys if shard_of(key[0], key[1], count) == index]
+
+
+class ShardWriter:
+    """
+    分片结果文件：每批结果追加写入后立即落盘；重新打开已有文件时读取已完成的台站，
+    检测失败的台站也写入一行（只有事件和台站），以免恢复时重复处理；
+    已有文件的表头与当前 CSV_HEADER 不同（旧版本写入）时拒绝续写，以免新行与表头错列
+    """
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+        if os.path.exists(path):
+            self._drop_partial_line()
+            with open(path, 'r', newline='') as f:
+                reader = csv.DictReader(f)
+                if reader.fieldnames is not None and reader.fieldnames != CSV_HEADER:
+                    raise ValueError(f"{path} was written with different columns; "
+                                     f"merge it separately and use a new --out-dir to resume")
+                for row in reader:
+                    self.done.add((row['event_id'], row['station_id']))
+
+        is_new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self._file = open(path, 'a', newline='')
+        self._writer = csv.DictWriter(self._file, fieldnames=CSV_HEADER, extrasaction='ignore')
+        if is_new:
+            self._writer.writeheader()
+            self._file.flush()
+
+    def _drop_partial_line(self):
+        """中断时可能留下不完整的最后一行，截断到最后一个换行符"""
+        with open(self.path, 'rb+') as f:
+            content = f.read()
+            if content and not content.endswith(b'\n'):
+                f.truncate(content.rfind(b'\n') + 1)
+
+    def write_batch(self, batch):
+        """
+        Appends [ ((event_id, station_id), picks or None) ] and syncs the file.
+        """
+        for (event_id, station_id), picks in batch:
+            row = {'event_id': event_id, 'station_id': station_id}
+            row.update(picks or {})
+            self._writer.writerow(row)
+            self.done.add((event_id, station_id))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class WorkQueue:
+    """
+    共享存储上的SQLite工作队列：台站按块入队，工作进程逐块领取；
+    领取后超过 lease_seconds 仍未完成的块（如工作进程崩溃）可被其他工作进程重新领取
+    """
+    def __init__(self, db_path, lease_seconds=3600.0):
+        self.lease_seconds = lease_seconds
+        # isolation_level=None: 事务由 BEGIN IMMEDIATE 显式开始，with 块结束时提交或回滚
+        self.conn = sqlite3.connect(db_path, timeout=60, isolation_level=None)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS chunks ("
+                          "id INTEGER PRIMARY KEY, keys TEXT NOT NULL, "
+                          "status TEXT NOT NULL DEFAULT 'pending', worker TEXT, claimed_at REAL)")
+
+    def populate(self, keys, chunk_size=256) -> bool:
+        """
+        Fills the queue with chunks of keys, unless another worker already did.
+        :return: 本次是否写入了队列
+        """
+        keys = list(keys)
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            if self.conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]:
+                return False
+            self.conn.executemany("INSERT INTO chunks (keys) VALUES (?)",
+                                  [(json.dumps(keys[i:i + chunk_size]),)
+                                   for i in range(0, len(keys), chunk_size)])
+        return True
+
+    def claim(self, worker_id):
+        """
+        Claims the next chunk: this worker's own unfinished chunk first (resume after restart),
+        then pending chunks, then chunks whose lease expired.
+        :return: (chunk_id, [(event_id, station_id), ...])，队列已空时返回 None
+        """
+        now = time.time()
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            row = self.conn.execute(
+                "SELECT id, keys FROM chunks "
+                "WHERE status = 'pending' OR (status = 'claimed' AND (worker = ? OR claimed_at < ?)) "
+                "ORDER BY worker = ? DESC, id LIMIT 1",
+                (worker_id, now - self.lease_seconds, worker_id)).fetchone()
+            if row is None:
+                return None
+            self.conn.execute("UPDATE chunks SET status = 'claimed', worker = ?, claimed_at = ? WHERE id = ?",
+                              (worker_id, now, row[0]))
+        return row[0], [tuple(key) for key in json.loads(row[1])]
+
+    def complete(self, chunk_id):
+        self.conn.execute("UPDATE chunks SET status = 'done' WHERE id = ?", (chunk_id,))
+
+    def counts(self) -> dict:
+        """{status: 块数}"""
+        return dict(self.conn.execute("SELECT status, COUNT(*) FROM chunks GROUP BY status").fetchall())
+
+    def close(self):
+        self.conn.close()
+
+
+def pick_to_file(picker: BatchPicker, keys, writer: ShardWriter, batch_size=256, progress=None) -> int:
+    """
+    Picks the keys not yet in the writer's file (and not rejected by the picker's quality filter),
+    appending each batch as it completes.
+    :return: 本次处理的台站数
+    """
+    todo = picker.filter_keys(key for key in keys if key not in writer.done)
+    done = 0
+    for batch in picker.iter_batches(todo, batch_size):
+        writer.write_batch(batch)
+        done += len(batch)
+        if progress:
+            progress(done, len(todo))
+    return len(todo)
+
+
+def pick_from_queue(picker: BatchPicker, queue: WorkQueue, worker_id, writer: ShardWriter,
+                    batch_size=256, progress=None) -> int:
+    """
+    Claims and picks chunks until the queue is empty.
+    :param progress: 可选回调 progress(chunk_id, counts)
+    :return: 本次处理的台站数
+    """
+    total = 0
+    while True:
+        claimed = queue.claim(worker_id)
+        if claimed is None:
+            return total
+        chunk_id, keys = claimed
+        total += pick_to_file(picker, keys, writer, batch_size)
+        queue.complete(chunk_id)
+        if progress:
+            progress(chunk_id, queue.counts())
+
+
+def merge_shards(paths, out_path) -> int:
+    """
+    Merges per-shard pick files into one table; stations without picks are dropped
+    and a station found in several files keeps the last one read.
+    :return: 合并后的台站数
+    """
+    station_picks = {}
+    for path in sorted(paths):
+        for key, picks in read_picks_csv(path).items():
+            if picks:
+                station_picks[key] = picks
+    write_picks_csv(out_path, station_picks)
+    return len(station_picks)
@@ -0,0 +1,164 @@
+"""
+无界面的波形图批量导出：多进程并行，每个工作进程使用Agg后端并复用同一个图形模板
+（本模块不依赖Qt，可在命令行和工作进程中使用）
+"""
+
+import multiprocessing
+import numbers
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from matplotlib.patches import Rectangle
+import numpy as np
+
+from core.archive import archive_pool
+from core.data_loader import DataLoader, get_p_arrival_time
+from utils.decimation import decimate_minmax
+
+# 拾取标记的样式，与 WaveformWidget 一致
+PICK_LINE_STYLES = {
+    'p_arrival': dict(color='red', linestyle='--', label='P-Arrival'),
+    'onset_time': dict(color='green', linestyle='-', label='Onset'),
+    'end_time': dict(color='green', linestyle='--', label='End'),
+}
+
+
+class FigureTemplate:
+    """
+    可复用的单台站波形图：Z分量波形、P波检测窗口、拾取标记和脉冲区域
+    每次渲染只更新数据和位置，不重新创建Figure
+    """
+    def __init__(self, figsize=(8, 3), dpi=100, window_length=1.0):
+        self.window_length = window_length
+        self.figure = Figure(figsize=figsize, dpi=dpi)
+        FigureCanvasAgg(self.figure)
+        self.axes = self.figure.add_subplot(1, 1, 1)
+        self.axes.axhline(0, color='gray', linestyle='--', linewidth=0.6)
+        self.axes.set_xlabel("Time (s)")
+        self.axes.set_ylabel("Component Z")
+
+        self.wave_line, = self.axes.plot([], [], color='black', linewidth=0.8)
+        # 横向为数据坐标、纵向为轴坐标的矩形，用于P波窗口和脉冲区域
+        transform = self.axes.get_xaxis_transform()
+        self.p_window = self.axes.add_patch(Rectangle((0, 0), 0, 1, transform=transform,
+                                                      color='yellow', alpha=0.25, label='P window'))
+        self.pulse_area = self.axes.add_patch(Rectangle((0, 0), 0, 1, transform=transform,
+                                                        color='cyan', alpha=0.3))
+        self.pick_lines = {pick_type: self.axes.axvline(0, **style)
+                           for pick_type, style in PICK_LINE_STYLES.items()}
+        self.title = self.axes.set_title(" ")
+        self.figure.tight_layout(pad=1.5)
+
+    def render(self, trace, picks: dict, title, out_path):
+        """渲染一个台站并保存；输出格式由文件扩展名决定（png/pdf）"""
+        x = trace.times()
+        y = np.asarray(trace.data)
+        x, y = decimate_minmax(x, y, int(self.axes.bbox.width))
+        self.wave_line.set_data(x, y)
+        self.axes.set_xlim(x[0], x[-1])
+        if len(y):
+            low, high = float(np.min(y)), float(np.max(y))
+            margin = (high - low) * 0.1 or 1.0
+            self.axes.set_ylim(low - margin, high + margin)
+
+        p_arrival = picks.get('p_arrival')
+        if not isinstance(p_arrival, numbers.Real):
+            p_arrival = get_p_arrival_time(trace)
+            if p_arrival == -12345.0:
+                p_arrival = None
+        self.p_window.set_visible(p_arrival is not None)
+        if p_arrival is not None:
+            self.p_window.set_x(p_arrival)
+            self.p_window.set_width(self.window_length)
+
+        for pick_type, line in self.pick_lines.items():
+            value = p_arrival if pick_type == 'p_arrival' else picks.get(pick_type)
+            line.set_visible(isinstance(value, numbers.Real))
+            if line.get_visible():
+                line.set_xdata([value, value])
+
+        onset, end = picks.get('onset_time'), picks.get('end_time')
+        has_pulse = isinstance(onset, numbers.Real) and isinstance(end, numbers.Real)
+        self.pulse_area.set_visible(has_pulse)
+        if has_pulse:
+            self.pulse_area.set_x(onset)
+            self.pulse_area.set_width(end - onset)
+
+        self.title.set_text(title)
+        self.figure.savefig(out_path)
+
+
+# 每个工作进程的状态：在进程初始化时创建一次
+_worker = {}
+
+
+def _init_worker(base_dir, events, arrivals, figsize, dpi, window_length):
+    if multiprocessing.parent_process() is not None:
+        # fork 启动的工作进程继承了父进程已打开的归档句柄，各进程的读取会互相移动文件位置
+        archive_pool.reset_after_fork()
+    loader = DataLoader(base_dir)
+    loader.events = events
+    loader.arrivals = arrivals
+    _worker['loader'] = loader
+    _worker['template'] = FigureTemplate(figsize, dpi, window_length)
+
+
+def _render_job(job):
+    """工作进程中渲染一个台站，返回是否成功"""
+    event_id, station_id, picks, out_path = job
+    try:
+        stream = _worker['loader'].load_station_data(event_id, station_id)
+        z_trace = stream.select(component="Z") if stream else None
+        if not z_trace:
+            return False
+        _worker['template'].render(z_trace[0], picks, f"{event_id} / {station_id}", out_path)
+        return True
+    except Exception as e:
+        print(f"Error exporting {event_id}/{station_id}: {e}")
+        return False
+
+
+def export_figures(loader: DataLoader, station_picks: dict, out_dir, keys=None, fmt='png',
+                   workers=None, figsize=(8, 3), dpi=100, window_length=1.0) -> dict:
+    """
+    Renders the Z trace, P window and pick overlay of every station (or the given keys)
+    to <out_dir>/<event>_<station>.<fmt> using a pool of worker processes.
+    :param station_picks: { (event_id, station_id): picks }
+    :param workers: 进程数，None 为CPU核数，1 为在当前进程中渲染
+    :return: {'exported', 'failed', 'seconds', 'figures_per_second'}
+    """
+    if keys is None:
+        keys = [(event_id, station_id)
+                for event_id in sorted(loader.events)
+                for station_id in sorted(loader.events[event_id])]
+    os.makedirs(out_dir, exist_ok=True)
+    jobs = [(event_id, station_id, station_picks.get((event_id, station_id), {}),
+             os.path.join(out_dir, f"{event_id}_{station_id}.{fmt}"))
+            for event_id, station_id in keys]
+
+    initargs = (loader.base_dir, loader.events, loader.arrivals, figsize, dpi, window_length)
+    workers = min(workers or os.cpu_count() or 1, len(jobs))
+    start = time.perf_counter()
+    if workers == 1 or len(jobs) <= 1:
+        _init_worker(*initargs)
+        results = [_render_job(job) for job in jobs]
+    else:
+        # 从图形界面调用时用 spawn 启动，工作进程不继承父进程的Qt状态；命令行使用平台默认方式
+        context = multiprocessing.get_context('spawn' if 'PyQt6.QtCore' in sys.modules else None)
+        chunksize = max(1, len(jobs) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                 initializer=_init_worker, initargs=initargs) as pool:
+            results = list(pool.map(_render_job, jobs, chunksize=chunksize))
+    elapsed = time.perf_counter() - start
+
+    exported = sum(results)
+    return {
+        'exported': exported,
+        'failed': len(results) - exported,
+        'seconds': elapsed,
+        'figures_per_second': exported / elapsed if elapsed > 0 else 0.0
+    }
@@ -1,17 +1,34 @@
-import csv
 from PyQt6.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
                                QTreeView, QTextEdit, QStatusBar, QMenuBar, QToolBar, QDockWidget, QLabel, QFileDialog,
-                               QScrollArea, QPushButton, QMessageBox)
+                               QScrollArea, QPushButton, QMessageBox, QInputDialog, QAbstractItemView)
 from PyQt6.QtGui import QStandardItemModel, QStandardItem, QKeySequence, QUndoStack
-from PyQt6.QtCore import Qt, QModelIndex
-from obspy import read
+from PyQt6.QtCore import Qt, QModelIndex, QTimer
+from obspy.io.sac import SACTrace
+import numbers
 import numpy as np # Added for np.min and np.max
 
-from core.data_loader import DataLoader, get_p_arrival_time
+from core.data_loader import DataLoader, get_p_arrival_time, component_order
+from core.memory_budget import memory_budget
 from core.p_pulse_detector import PPulseDetector
+from core.batch_picker import BatchPicker
+from core.detector_cache import DetectorCache
+from core.pick_store import write_picks_csv, read_arrivals_csv, component_picks, HORIZONTAL_PREFIXES
+from core.preprocessing import Preprocessor
+from core.quality import compute_quality, passes_quality
+from core.sac_io import SAC_PICK_HEADERS, is_archive_member
 from gui.plot_widgets import WaveformWidget
+from gui.record_section import RecordSectionWidget
+from gui.figure_export import export_figures
 from gui.commands import PickCommand, AutoPickCommand
 
+# 文件树排序使用的数据角色
+TREE_SORT_ROLE = Qt.ItemDataRole.UserRole + 3
+# 文件树中的质量指标列：(指标名, 表头, 显示倍数)
+QUALITY_COLUMNS = [('snr', 'SNR', 1.0), ('clip_fraction', '削波%', 100.0), ('gap_fraction', '缺失%', 100.0)]
+# 状态栏内存用量的刷新间隔
+MEMORY_STATUS_INTERVAL_MS = 1000
+
+
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -24,8 +41,14 @@ class MainWindow(QMainWindow):
         self.current_event_id = None # 当前事件ID
         self.current_picks = {} # 保存当前拾取结果
         self.all_station_picks = {} # { (event, station): picks }
-        self.p_pulse_detector = PPulseDetector()
+        self.quality_index = {} # { (event, station): 质量指标 }
+        self.min_snr = None # 文件树筛选和批量拾取的最低信噪比
+        # 显示和检测共用同一个预处理器，滤波结果只计算一次
+        self.preprocessor = Preprocessor()
+        self.p_pulse_detector = PPulseDetector(cache=DetectorCache())
         self.zoom_windows = [] # 管理放大窗口
+        self._budget_owner = object() # 当前波形在内存预算中的登记键
+        self.record_section_dock = None # 事件记录剖面（首次打开时创建）
         self.undo_stack = QUndoStack(self)
         self.setup_ui()
 
@@ -40,6 +63,11 @@ class MainWindow(QMainWindow):
         self.file_tree_view = QTreeView()
         self.file_tree_model = QStandardItemModel()
         self.file_tree_view.setModel(self.file_tree_model)
+        # 按排序角色中的数值排序（质量指标列），点击表头切换
+        self.file_tree_model.setSortRole(TREE_SORT_ROLE)
+        self.file_tree_view.setSortingEnabled(True)
+        # 允许多选台站，用于导出部分台站的波形图
+        self.file_tree_view.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
         self.file_tree_view.clicked.connect(self.on_tree_item_clicked)
         self.file_tree_dock.setWidget(self.file_tree_view)
         self.addDockWidget(Qt.DockWidgetArea.LeftDockWidgetArea, self.file_tree_dock)
@@ -78,6 +106,14 @@ class MainWindow(QMainWindow):
         self.status_bar = QStatusBar()
         self.setStatusBar(self.status_bar)
         self.status_bar.showMessage("准备就绪")
+        # 全局内存预算的当前用量（缓存/视图/图形），定时刷新
+        self.memory_label = QLabel()
+        self.status_bar.addPermanentWidget(self.memory_label)
+        self.memory_timer = QTimer(self)
+        self.memory_timer.setInterval(MEMORY_STATUS_INTERVAL_MS)
+        self.memory_timer.timeout.connect(self.update_memory_status)
+        self.memory_timer.start()
+        self.update_memory_status()
         
         # 添加鼠标操作说明面板
         self.create_mouse_help_panel()
@@ -92,6 +128,10 @@ class MainWindow(QMainWindow):
         save_action.triggered.connect(self.save_results_to_csv)
         save_sac_action = file_menu.addAction("将结果写回SAC文件")
         save_sac_action.triggered.connect(self.save_results_to_sac)
+        arrivals_action = file_menu.addAction("加载P波到时表 (CSV)")
+        arrivals_action.triggered.connect(self.load_arrivals)
+        export_figures_action = file_menu.addAction("导出波形图 (PNG/PDF)")
+        export_figures_action.triggered.connect(self.export_station_figures)
         file_menu.addSeparator()
         file_menu.addAction("退出")
         # 编辑菜单
@@ -106,8 +146,27 @@ class MainWindow(QMainWindow):
         
         # 视图菜单
         view_menu = menu_bar.addMenu("视图")
+        self.three_component_action = view_menu.addAction("三分量模式")
+        self.three_component_action.setCheckable(True)
+        self.three_component_action.toggled.connect(self.toggle_three_component)
+        self.filtered_view_action = view_menu.addAction("显示滤波波形")
+        self.filtered_view_action.setCheckable(True)
+        self.filtered_view_action.toggled.connect(self.toggle_filtered_view)
+        record_section_action = view_menu.addAction("事件记录剖面")
+        record_section_action.triggered.connect(self.show_record_section)
         # 工具菜单
         tools_menu = menu_bar.addMenu("工具")
+        batch_pick_action = tools_menu.addAction("批量自动拾取")
+        batch_pick_action.triggered.connect(self.batch_auto_pick)
+        quality_action = tools_menu.addAction("计算数据质量（信噪比/削波/缺失）")
+        quality_action.triggered.connect(self.compute_quality_index)
+        quality_filter_action = tools_menu.addAction("按信噪比筛选台站...")
+        quality_filter_action.triggered.connect(self.filter_stations_by_quality)
+        self.preprocess_action = tools_menu.addAction("检测前预处理（去趋势/尖灭/滤波）")
+        self.preprocess_action.setCheckable(True)
+        self.preprocess_action.toggled.connect(self.toggle_detection_preprocessing)
+        memory_limit_action = tools_menu.addAction("设置内存预算...")
+        memory_limit_action.triggered.connect(self.set_memory_limit)
         # 帮助菜单
         help_menu = menu_bar.addMenu("帮助")
 
@@ -147,22 +206,115 @@ class MainWindow(QMainWindow):
         dir_path = QFileDialog.getExistingDirectory(self, "选择数据根目录", "example_data")
         if dir_path:
             self.status_bar.showMessage(f"正在加载目录: {dir_path}")
-            self.loader = DataLoader(dir_path)
+            self.loader = DataLoader(dir_path, three_component=self.three_component_action.isChecked())
+            # 同时只读头段读回之前写入SAC文件的拾取结果，继续上次的检查
+            self.loader.scan_files(harvest_picks=True)
+            self.quality_index = {}
+            self.all_station_picks = {key: picks.copy() for key, picks in self.loader.header_picks.items()}
+            self.populate_file_tree(self.loader.events)
+            self.status_bar.showMessage(f"目录加载完成，已读回 {len(self.all_station_picks)} 个台站的拾取结果", 5000)
+
+    def load_arrivals(self):
+        """加载外部P波到时表（event_id, station_id, p_time），用于头段中没有到时的miniSEED数据"""
+        if not self.loader:
+            self.status_bar.showMessage("请先打开数据目录", 5000)
+            return
+
+        file_path, _ = QFileDialog.getOpenFileName(self, "加载P波到时表", "", "CSV Files (*.csv);;All Files (*)")
+        if not file_path:
+            return
+        try:
+            self.loader.arrivals.update(read_arrivals_csv(file_path))
+        except (IOError, KeyError, ValueError) as e:
+            self.status_bar.showMessage(f"加载失败: {e}", 5000)
+            return
+        self.status_bar.showMessage(f"已加载 {len(self.loader.arrivals)} 个台站的P波到时", 5000)
+
+    def toggle_three_component(self, checked):
+        """
+        切换三分量模式，已打开目录时重新扫描
+        """
+        if self.loader:
+            self.loader.three_component = checked
+            self.loader.events = {}
             self.loader.scan_files()
             self.populate_file_tree(self.loader.events)
-            self.status_bar.showMessage("目录加载完成", 5000)
+        self.status_bar.showMessage("三分量模式已开启" if checked else "三分量模式已关闭", 5000)
+
+    @property
+    def display_preprocessor(self):
+        """波形显示使用的预处理器，未开启滤波显示时为None"""
+        if self.filtered_view_action.isChecked():
+            return self.preprocessor
+        return None
+
+    def toggle_filtered_view(self, checked):
+        """在原始波形和滤波波形之间切换显示（滤波结果有缓存，切换不会重复滤波）"""
+        if self.current_stream:
+            self.main_plot_widget.plot_stream(self.current_stream)
+            self.main_plot_widget.plot_picks(self.current_picks)
+        self.status_bar.showMessage("显示滤波波形" if checked else "显示原始波形", 5000)
+
+    def toggle_detection_preprocessing(self, checked):
+        """开启或关闭自动拾取前的预处理"""
+        self.p_pulse_detector.preprocessor = self.preprocessor if checked else None
+        self.status_bar.showMessage("检测前预处理已开启" if checked else "检测前预处理已关闭", 5000)
+
+    def selected_event_id(self):
+        """当前选中的事件：选中台站时为其所属事件"""
+        if self.current_event_id:
+            return self.current_event_id
+        item = self.file_tree_model.itemFromIndex(self.file_tree_view.currentIndex().siblingAtColumn(0))
+        if item and not item.parent():
+            return item.text()
+        return None
+
+    def show_record_section(self):
+        """显示当前事件所有台站的记录剖面"""
+        event_id = self.selected_event_id()
+        if not self.loader or not event_id:
+            self.status_bar.showMessage("请先在左侧选择一个事件或台站", 5000)
+            return
+
+        if self.record_section_dock is None:
+            self.record_section_dock = QDockWidget("事件记录剖面", self)
+            self.record_section = RecordSectionWidget(main_window=self, parent=self.record_section_dock)
+            self.record_section.pick_made.connect(self.handle_section_pick)
+            self.record_section_dock.setWidget(self.record_section)
+            self.addDockWidget(Qt.DockWidgetArea.RightDockWidgetArea, self.record_section_dock)
+            self.record_section_dock.setFloating(True)
+            self.record_section_dock.resize(700, 900)
+
+        self.update_picks_for_current_station()
+        self.status_bar.showMessage(f"正在绘制记录剖面 {event_id}...")
+        self.record_section.plot_event(self.loader, event_id, self.all_station_picks,
+                                       preprocessor=self.display_preprocessor)
+        self.record_section_dock.show()
+        self.status_bar.showMessage(f"记录剖面: {event_id} ({len(self.record_section.station_ids)} 个台站)", 5000)
+
+    def handle_section_pick(self, event_id, station_id, pick_type, time):
+        """处理记录剖面上的拾取：当前台站走命令模式，其他台站直接写入拾取结果"""
+        if (event_id, station_id) == (self.current_event_id, self.current_station_id):
+            self.handle_manual_pick(pick_type, time)
+            self.update_picks_for_current_station()
+        else:
+            station_picks = self.all_station_picks.setdefault((event_id, station_id), {})
+            station_picks[pick_type] = time
+            self.status_bar.showMessage(f"手动拾取 {station_id}: {pick_type} @ {time:.4f}s", 5000)
+        self.record_section.plot_picks(self.all_station_picks)
 
     def populate_file_tree(self, events_data):
         """
         用扫描到的事件和台站数据填充文件树
         """
         self.file_tree_model.clear()
-        self.file_tree_model.setHorizontalHeaderLabels(['事件/台站'])
+        self.file_tree_model.setHorizontalHeaderLabels(['事件/台站'] + [label for _, label, _ in QUALITY_COLUMNS])
         root_node = self.file_tree_model.invisibleRootItem()
 
         for event_id, stations in sorted(events_data.items()):
             event_item = QStandardItem(event_id)
             event_item.setEditable(False)
+            event_item.setData(event_id, TREE_SORT_ROLE)
             root_node.appendRow(event_item)
             for station_id in sorted(stations.keys()):
                 station_item = QStandardItem(station_id)
@@ -170,7 +322,79 @@ class MainWindow(QMainWindow):
                 # 存储事件和台站ID以便后续检索
                 station_item.setData(event_id, Qt.ItemDataRole.UserRole + 1)
                 station_item.setData(station_id, Qt.ItemDataRole.UserRole + 2)
-                event_item.appendRow(station_item)
+                station_item.setData(station_id, TREE_SORT_ROLE)
+                event_item.appendRow([station_item] + self._quality_items(self.quality_index.get((event_id, station_id))))
+        self.apply_quality_filter()
+
+    @staticmethod
+    def _quality_items(metrics):
+        """文件树中一个台站的质量指标列"""
+        items = []
+        for name, _, scale in QUALITY_COLUMNS:
+            value = metrics.get(name) if metrics else None
+            item = QStandardItem("" if value is None or np.isnan(value) else f"{value * scale:.1f}")
+            item.setEditable(False)
+            # 没有指标的台站排在最前
+            item.setData(-1.0 if value is None or np.isnan(value) else value, TREE_SORT_ROLE)
+            items.append(item)
+        return items
+
+    def compute_quality_index(self):
+        """计算所有台站P波附近的质量指标，并显示在文件树中"""
+        if not self.loader:
+            self.status_bar.showMessage("请先打开数据目录", 5000)
+            return
+
+        self.status_bar.showMessage("正在计算数据质量...")
+        self.quality_index = compute_quality(self.loader)
+        self.populate_file_tree(self.loader.events)
+        self.status_bar.showMessage(f"数据质量: {len(self.quality_index)} 个台站", 5000)
+
+    def update_memory_status(self):
+        usage = memory_budget.usage()
+        mb = 1024 * 1024
+        self.memory_label.setText(f"内存 {usage['total'] / mb:.0f}/{usage['limit'] / mb:.0f} MB")
+        details = ", ".join(f"{category} {nbytes / mb:.1f} MB" for category, nbytes in sorted(usage['categories'].items()))
+        self.memory_label.setToolTip(f"{details or '无'}；已释放 {usage['evictions']} 项缓存")
+
+    def set_memory_limit(self):
+        """设置全局内存预算；超出时按最近最少使用释放窗口和预处理缓存"""
+        limit_mb, ok = QInputDialog.getInt(self, "设置内存预算", "内存预算 (MB):",
+                                           memory_budget.limit_bytes // (1024 * 1024), 16, 1024 * 1024)
+        if not ok:
+            return
+        memory_budget.set_limit(limit_mb * 1024 * 1024)
+        self.update_memory_status()
+        self.status_bar.showMessage(f"内存预算已设置为 {limit_mb} MB", 5000)
+
+    def filter_stations_by_quality(self):
+        """隐藏信噪比低于阈值的台站，批量自动拾取也会跳过这些台站（阈值为0时取消筛选）"""
+        if not self.quality_index:
+            self.compute_quality_index()
+        if not self.quality_index:
+            return
+
+        min_snr, ok = QInputDialog.getDouble(self, "按信噪比筛选台站", "最低信噪比 (0 为不筛选):",
+                                             self.min_snr or 0.0, 0.0, 1e6, 1)
+        if not ok:
+            return
+        self.min_snr = min_snr or None
+        self.apply_quality_filter()
+
+    def apply_quality_filter(self):
+        """按 min_snr 显示或隐藏文件树中的台站"""
+        hidden = 0
+        root_node = self.file_tree_model.invisibleRootItem()
+        for event_row in range(root_node.rowCount()):
+            event_item = root_node.child(event_row)
+            for station_row in range(event_item.rowCount()):
+                station_item = event_item.child(station_row)
+                key = (event_item.text(), station_item.text())
+                hide = not passes_quality(self.quality_index.get(key), min_snr=self.min_snr)
+                self.file_tree_view.setRowHidden(station_row, event_item.index(), hide)
+                hidden += hide
+        if self.min_snr is not None:
+            self.status_bar.showMessage(f"信噪比 < {self.min_snr:g} 的 {hidden} 个台站已隐藏", 5000)
 
     def on_tree_item_clicked(self, index: QModelIndex):
         """
@@ -179,7 +403,7 @@ class MainWindow(QMainWindow):
         # 保存上一个台站的拾取结果
         self.update_picks_for_current_station()
 
-        item = self.file_tree_model.itemFromIndex(index)
+        item = self.file_tree_model.itemFromIndex(index.siblingAtColumn(0))
         if not item or not item.parent(): # 确保点击的是台站项
             self.current_event_id = None
             self.current_station_id = None
@@ -192,6 +416,9 @@ class MainWindow(QMainWindow):
             station_key = (self.current_event_id, self.current_station_id)
             self.status_bar.showMessage(f"正在加载 {self.current_event_id}/{self.current_station_id}...")
             self.current_stream = self.loader.load_station_data(self.current_event_id, self.current_station_id)
+            # 主图和放大窗口共享这份数据，按一份计入内存预算
+            memory_budget.register((self._budget_owner, 'current_stream'),
+                                   sum(tr.data.nbytes for tr in self.current_stream or []), 'views')
             # 加载该台站已有的拾取结果
             self.current_picks = self.all_station_picks.get(station_key, {})
             self.undo_stack.clear() # 为新台站清空撤销栈
@@ -201,8 +428,8 @@ class MainWindow(QMainWindow):
                 z_trace = self.current_stream.select(component="Z")
                 if z_trace:
                     p_arrival = get_p_arrival_time(z_trace[0])
-                    # 如果SAC头文件中有有效的P波到时，添加到picks中
-                    if p_arrival != -12345.0:
+                    # 如果SAC头文件中有有效的P波到时且尚无P波拾取，添加到picks中
+                    if p_arrival != -12345.0 and 'p_arrival' not in self.current_picks:
                         self.current_picks['p_arrival'] = p_arrival
                 
                 self.main_plot_widget.plot_stream(self.current_stream)
@@ -238,7 +465,9 @@ class MainWindow(QMainWindow):
             return
             
         self.status_bar.showMessage("正在自动拾取P波脉冲...")
-        results = self.p_pulse_detector.detect_pulse(trace, p_arrival)
+        # 三分量模式下Z分量和水平分量的结果都来自同一次三分量检测
+        three_component = bool(self.loader and self.loader.three_component)
+        results = self.p_pulse_detector.detect_station(self.current_stream, p_arrival, three_component)
         
         if results:
             command = AutoPickCommand(self, results)
@@ -247,11 +476,37 @@ class MainWindow(QMainWindow):
         else:
             self.status_bar.showMessage("自动拾取失败", 5000)
             
+    def batch_auto_pick(self):
+        """对所有台站进行自动拾取，每个台站只读取P波附近的数据窗口"""
+        if not self.loader:
+            self.status_bar.showMessage("请先打开数据目录", 5000)
+            return
+
+        self.update_picks_for_current_station()
+        self.status_bar.showMessage("正在批量自动拾取...")
+        results = BatchPicker(self.loader, self.p_pulse_detector,
+                              quality=self.quality_index, min_snr=self.min_snr).run()
+
+        current_key = (self.current_event_id, self.current_station_id)
+        for station_key, picks in results.items():
+            if station_key == current_key:
+                # 当前台站通过命令模式应用，以便撤销
+                new_picks = self.current_picks.copy()
+                new_picks.update(picks)
+                self.undo_stack.push(AutoPickCommand(self, new_picks))
+                continue
+            station_picks = self.all_station_picks.get(station_key, {}).copy()
+            station_picks.update(picks)
+            self.all_station_picks[station_key] = station_picks
+
+        self.status_bar.showMessage(f"批量自动拾取完成: {len(results)} 个台站", 5000)
+
     def display_pick_results(self, results):
         """将拾取结果显示在参数面板"""
         
         def format_value(value, format_spec):
-            if isinstance(value, (int, float)):
+            # 头段中的到时为 numpy 浮点数
+            if isinstance(value, numbers.Real):
                 return format(value, format_spec)
             return "N/A"
 
@@ -264,6 +519,21 @@ class MainWindow(QMainWindow):
             f"峰值时间 (t_peak): {format_value(results.get('peak_time'), '.4f')}\n"
             f"脉冲面积 (area): {format_value(results.get('pulse_area'), '.4e')}\n"
         )
+        if 'vector_peak_amplitude' in results:
+            text += f"矢量峰值振幅 (vector_amp): {format_value(results.get('vector_peak_amplitude'), '.4e')}\n"
+            text += f"矢量峰值时间 (t_vector_peak): {format_value(results.get('vector_peak_time'), '.4f')}\n"
+        # 三分量模式下的水平分量脉冲参数
+        for prefix, label in zip(HORIZONTAL_PREFIXES, ("N/1", "E/2")):
+            if f"{prefix}_peak_amplitude" not in results:
+                continue
+            text += (
+                f"[{label}] 极性: {results.get(f'{prefix}_polarity', 'N/A')}, "
+                f"起始: {format_value(results.get(f'{prefix}_onset_time'), '.4f')}, "
+                f"结束: {format_value(results.get(f'{prefix}_end_time'), '.4f')}, "
+                f"峰值: {format_value(results.get(f'{prefix}_peak_amplitude'), '.4e')} "
+                f"@ {format_value(results.get(f'{prefix}_peak_time'), '.4f')}, "
+                f"面积: {format_value(results.get(f'{prefix}_pulse_area'), '.4e')}\n"
+            )
         self.params_widget.setText(text)
         
     def handle_manual_pick(self, pick_type: str, time: float):
@@ -313,21 +583,44 @@ class MainWindow(QMainWindow):
         if not file_path:
             return
             
-        header = ['event_id', 'station_id', 'p_arrival', 'polarity', 'onset_time', 
-                  'end_time', 'peak_amplitude', 'peak_time', 'pulse_area']
-        
         try:
-            with open(file_path, 'w', newline='') as f:
-                writer = csv.DictWriter(f, fieldnames=header)
-                writer.writeheader()
-                for (event_id, station_id), picks in sorted(self.all_station_picks.items()):
-                    row = {'event_id': event_id, 'station_id': station_id}
-                    row.update(picks)
-                    writer.writerow(row)
+            write_picks_csv(file_path, self.all_station_picks)
             self.status_bar.showMessage(f"结果已保存到 {file_path}", 5000)
         except IOError as e:
             self.status_bar.showMessage(f"保存失败: {e}", 5000)
 
+    def selected_station_keys(self):
+        """文件树中选中的台站；选中事件时包含该事件的所有台站"""
+        keys = []
+        for index in self.file_tree_view.selectionModel().selectedRows():
+            item = self.file_tree_model.itemFromIndex(index)
+            if item.parent():
+                keys.append((item.data(Qt.ItemDataRole.UserRole + 1), item.data(Qt.ItemDataRole.UserRole + 2)))
+            else:
+                keys.extend((item.text(), station_id) for station_id in sorted(self.loader.events.get(item.text(), {})))
+        return sorted(set(keys))
+
+    def export_station_figures(self):
+        """将选中台站（未选中时为全部台站）的波形和拾取结果导出为图片"""
+        if not self.loader:
+            self.status_bar.showMessage("请先打开数据目录", 5000)
+            return
+
+        out_dir = QFileDialog.getExistingDirectory(self, "选择导出目录")
+        if not out_dir:
+            return
+        fmt, ok = QInputDialog.getItem(self, "导出波形图", "格式:", ["png", "pdf"], 0, False)
+        if not ok:
+            return
+
+        self.update_picks_for_current_station()
+        keys = self.selected_station_keys() or None
+        self.status_bar.showMessage("正在导出波形图...")
+        stats = export_figures(self.loader, self.all_station_picks, out_dir, keys=keys, fmt=fmt,
+                               window_length=self.p_pulse_detector.window_length)
+        self.status_bar.showMessage(f"已导出 {stats['exported']} 张波形图 ({stats['figures_per_second']:.1f} 张/秒)"
+                                    f"，失败 {stats['failed']} -> {out_dir}", 10000)
+
     def save_results_to_sac(self):
         """将拾取结果写回到对应的SAC文件头中"""
         self.update_picks_for_current_station()
@@ -352,21 +645,20 @@ class MainWindow(QMainWindow):
             try:
                 # 获取该台站所有分量的文件路径
                 station_files = self.loader.events[event_id][station_id]
-                stream = read(list(station_files.values()))
-                
-                for trace in stream:
-                    # 写入未使用的时间标记和用户自定义变量
-                    sac_header = trace.stats.sac
-                    sac_header['t4'] = picks.get('p_arrival')
-                    sac_header['t5'] = picks.get('onset_time')
-                    sac_header['t6'] = picks.get('end_time')
-                    sac_header['t7'] = picks.get('peak_time')
-                    sac_header['user0'] = picks.get('peak_amplitude')
-                    sac_header['user1'] = picks.get('pulse_area')
-                    
-                    # 写回文件
-                    trace.write(trace.stats.network + '.' + trace.stats.station + '.' + trace.stats.channel + '.SAC', format='SAC')
-                
+                for component, path in station_files.items():
+                    if is_archive_member(path):
+                        raise IOError(f"归档中的文件不能写回: {path}")
+                    if self.loader.backend_for(path).name != 'sac':
+                        raise IOError(f"只能写回SAC文件: {path}")
+                    # 写入未使用的时间标记和用户自定义变量，只改写头段，不读写波形数据
+                    # 水平分量文件写入该分量自己的脉冲参数（三分量检测结果）
+                    file_picks = component_picks(picks, component_order(component))
+                    sac = SACTrace.read(path, headonly=True)
+                    for sac_key, pick_key in SAC_PICK_HEADERS.items():
+                        value = file_picks.get(pick_key)
+                        setattr(sac, sac_key, value if isinstance(value, numbers.Real) else None)
+                    sac.write(path, headonly=True)
+
                 saved_count += 1
             except Exception as e:
                 self.status_bar.showMessage(f"写入 {station_id} 失败: {e}", 8000)
@@ -393,7 +685,8 @@ class MainWindow(QMainWindow):
         # 放大图
         zoom_widget = WaveformWidget(main_window=self, parent=self)
         if self.current_stream:
-            zoom_widget.plot_stream(self.current_stream.copy())
+            # 放大窗口只读取数据，直接共享当前波形而不复制
+            zoom_widget.plot_stream(self.current_stream)
             
             # 设置X轴范围
             ref_time = self.current_stream[0].stats.starttime
@@ -406,8 +699,8 @@ class MainWindow(QMainWindow):
             zoom_widget.setMinimumHeight(250)
             zoom_widget.figure.subplots_adjust(left=0.1, right=0.95, top=0.9, bottom=0.2)
             
-            # 调整Y轴，使波形居中并放大
-            data = self.current_stream[0].data
+            # 调整Y轴，使波形居中并放大（使用实际绘制的数据，可能是滤波后的）
+            data = zoom_widget.plotted_trace.data if zoom_widget.plotted_trace else self.current_stream[0].data
             start_idx = int(start_time_rel * self.current_stream[0].stats.sampling_rate)
             end_idx = int(end_time_rel * self.current_stream[0].stats.sampling_rate)
             
@@ -1,12 +1,21 @@
-from PyQt6.QtWidgets import QWidget, QVBoxLayout
-from PyQt6.QtCore import pyqtSignal
+from PyQt6.QtWidgets import QWidget, QVBoxLayout, QApplication
+from PyQt6.QtCore import pyqtSignal, QTimer
 from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.figure import Figure
 from matplotlib.widgets import SpanSelector
 import matplotlib.dates as mdates
+import weakref
 import numpy as np
 from obspy.core.stream import Stream
 
+from utils.decimation import decimate_minmax
+from core.memory_budget import memory_budget
+
+# 重绘节流间隔（毫秒），约等于显示器刷新周期
+REDRAW_INTERVAL_MS = 16
+# 滚轮每格的缩放比例
+WHEEL_ZOOM_FACTOR = 0.8
+
 class WaveformWidget(QWidget):
     # 信号定义： pick_type (str), time (float, 相对时间)
     pick_made = pyqtSignal(str, float)
@@ -19,6 +28,9 @@ class WaveformWidget(QWidget):
         self.figure = Figure(figsize=(5, 4), dpi=100)
         self.canvas = FigureCanvas(self.figure)
         self.canvas.mpl_connect('button_press_event', self.on_mouse_click)
+        self.canvas.mpl_connect('scroll_event', self.on_scroll)
+        self.canvas.mpl_connect('motion_notify_event', self.on_mouse_move)
+        self.canvas.mpl_connect('button_release_event', self.on_mouse_release)
         
         layout = QVBoxLayout()
         layout.addWidget(self.canvas)
@@ -28,6 +40,33 @@ class WaveformWidget(QWidget):
         self.axes = self.figure.add_subplot(1, 1, 1) # 单个子图
         self.figure.tight_layout(pad=2.0) # 调整布局
         self.pick_markers = [] # 用于存储拾取标记
+        self.plotted_trace = None # 当前绘制的Z分量（可能经过预处理）
+
+        # 完整波形数据（x为matplotlib日期），只有可见范围按分辨率抽稀后交给 Line2D
+        self.wave_line = None
+        self.x_full = None
+        self.y_full = None
+        self.full_xlim = None
+        self.pan_start = None # 中键拖拽起点: (像素x, 当时的xlim)
+
+        # 登记到全局内存预算：时间轴数组（views）和画布像素缓冲（figures）；
+        # 波形数据与 current_stream 或预处理缓存共享，已由它们计入
+        self._budget_owner = object()
+        owner = self._budget_owner
+        self.destroyed.connect(lambda *_: memory_budget.release_owner(owner))
+        weakref.finalize(self, memory_budget.release_owner, self._budget_owner)
+
+        # 视图变化时合并重绘请求，每个刷新周期最多重绘一次
+        self.redraw_timer = QTimer(self)
+        self.redraw_timer.setSingleShot(True)
+        self.redraw_timer.setInterval(REDRAW_INTERVAL_MS)
+        self.redraw_timer.timeout.connect(self.render_visible)
+
+        # 左键拾取延迟到双击间隔之后，以便区分单击拾取和双击复位
+        self.pending_pick = None
+        self.pick_timer = QTimer(self)
+        self.pick_timer.setSingleShot(True)
+        self.pick_timer.timeout.connect(self.emit_pending_pick)
 
         # 添加 SpanSelector 用于拖拽放大
         self.span_selector = SpanSelector(
@@ -56,8 +95,19 @@ class WaveformWidget(QWidget):
             return
             
         tr = trace[0]
-        time_values = [t.matplotlib_date for t in tr.times("utcdatetime")]
-        self.axes.plot(time_values, tr.data, color='black', linewidth=0.8)
+        # 主窗口开启滤波显示时绘制预处理后的波形
+        preprocessor = getattr(self.main_window, 'display_preprocessor', None)
+        if preprocessor is not None:
+            tr = preprocessor.process_trace(tr)
+        self.plotted_trace = tr
+
+        self.x_full = tr.stats.starttime.matplotlib_date + tr.times() / 86400.0
+        self.y_full = tr.data
+        self.full_xlim = (self.x_full[0], self.x_full[-1])
+        self.wave_line, = self.axes.plot([], [], color='black', linewidth=0.8)
+        self.axes.set_xlim(*self.full_xlim)
+        self.update_line_data()
+        self.axes.callbacks.connect('xlim_changed', self.on_xlim_changed)
         self.axes.axhline(0, color='gray', linestyle='--', linewidth=0.6)
         self.axes.set_ylabel('Component Z')
         
@@ -74,6 +124,7 @@ class WaveformWidget(QWidget):
         self.figure.autofmt_xdate()
         
         self.canvas.draw()
+        self.update_memory_usage()
     
     def clear_plot(self):
         """
@@ -82,9 +133,22 @@ class WaveformWidget(QWidget):
         for marker in self.pick_markers:
             marker.remove()
         self.pick_markers.clear()
+        self.plotted_trace = None
+        self.wave_line = None
+        self.x_full = self.y_full = self.full_xlim = None
 
         self.axes.clear()
         self.canvas.draw()
+        self.update_memory_usage()
+
+    def update_memory_usage(self):
+        """更新本控件在内存预算中登记的字节数"""
+        width, height = self.canvas.get_width_height(physical=True)
+        memory_budget.register((self._budget_owner, 'figure'), width * height * 4, 'figures')
+        if self.x_full is not None:
+            memory_budget.register((self._budget_owner, 'x_full'), self.x_full.nbytes, 'views')
+        else:
+            memory_budget.release((self._budget_owner, 'x_full'))
 
     def plot_picks(self, picks: dict):
         """
@@ -135,11 +199,82 @@ class WaveformWidget(QWidget):
             
             self.canvas.draw()
 
+    def update_line_data(self):
+        """只取可见时间范围内的数据，并按画布像素宽度做最大/最小值抽稀"""
+        if self.wave_line is None or self.x_full is None:
+            return
+        xmin, xmax = self.axes.get_xlim()
+        i0 = max(np.searchsorted(self.x_full, xmin) - 1, 0)
+        i1 = min(np.searchsorted(self.x_full, xmax) + 1, len(self.x_full))
+        n_bins = max(int(self.axes.bbox.width), 100)
+        x, y = decimate_minmax(self.x_full[i0:i1], self.y_full[i0:i1], n_bins)
+        self.wave_line.set_data(x, y)
+
+    def render_visible(self):
+        """节流后的重绘：更新可见范围的线数据，其余图形元素原样复用"""
+        self.update_line_data()
+        self.canvas.draw_idle()
+
+    def request_redraw(self):
+        """请求重绘；同一刷新周期内的多次请求只执行一次"""
+        if not self.redraw_timer.isActive():
+            self.redraw_timer.start()
+
+    def on_xlim_changed(self, axes):
+        self.request_redraw()
+
+    def reset_view(self):
+        """复位到完整时间范围"""
+        if self.full_xlim is not None:
+            self.axes.set_xlim(*self.full_xlim)
+
+    def on_scroll(self, event):
+        """滚轮以鼠标位置为中心缩放时间轴"""
+        if event.inaxes != self.axes or self.full_xlim is None or event.xdata is None:
+            return
+        factor = WHEEL_ZOOM_FACTOR ** event.step
+        xmin, xmax = self.axes.get_xlim()
+        new_min = event.xdata - (event.xdata - xmin) * factor
+        new_max = event.xdata + (xmax - event.xdata) * factor
+        # 不缩小到完整范围之外
+        if new_max - new_min >= self.full_xlim[1] - self.full_xlim[0]:
+            new_min, new_max = self.full_xlim
+        self.axes.set_xlim(new_min, new_max)
+
+    def on_mouse_move(self, event):
+        """中键拖拽平移时间窗口"""
+        if self.pan_start is None:
+            return
+        start_x, (xmin, xmax) = self.pan_start
+        shift = (event.x - start_x) * (xmax - xmin) / self.axes.bbox.width
+        self.axes.set_xlim(xmin - shift, xmax - shift)
+
+    def on_mouse_release(self, event):
+        if event.button == 2:
+            self.pan_start = None
+
+    def emit_pending_pick(self):
+        if self.pending_pick:
+            self.pick_made.emit(*self.pending_pick)
+            self.pending_pick = None
+
     def on_mouse_click(self, event):
         """处理matplotlib画布上的鼠标点击事件"""
         if event.inaxes != self.axes:
             return
 
+        # 双击复位视图，并取消第一次单击产生的待定拾取
+        if event.dblclick:
+            self.pick_timer.stop()
+            self.pending_pick = None
+            self.reset_view()
+            return
+
+        # 中键开始平移
+        if event.button == 2:
+            self.pan_start = (event.x, self.axes.get_xlim())
+            return
+
         if not self.main_window or not self.main_window.current_stream:
             return
 
@@ -160,7 +295,8 @@ class WaveformWidget(QWidget):
                 pick_type = 'end_time'
 
         if pick_type:
-            self.pick_made.emit(pick_type, relative_time_sec.total_seconds())
+            self.pending_pick = (pick_type, relative_time_sec.total_seconds())
+            self.pick_timer.start(QApplication.doubleClickInterval())
 
     def on_span_select(self, xmin, xmax):
         """当用户拖拽选择一个区域时调用"""
@@ -0,0 +1,143 @@
+from PyQt6.QtWidgets import QWidget, QVBoxLayout
+from PyQt6.QtCore import pyqtSignal
+from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg as FigureCanvas
+from matplotlib.figure import Figure
+from matplotlib.collections import LineCollection
+import numpy as np
+
+from core.data_loader import get_p_arrival_time
+from utils.decimation import decimate_minmax
+
+# 拾取标记的样式，与 WaveformWidget 一致
+PICK_STYLES = {
+    'p_arrival': dict(colors='red', linestyles='--', label='P-Arrival'),
+    'onset_time': dict(colors='green', linestyles='-', label='Onset'),
+    'end_time': dict(colors='green', linestyles='--', label='End'),
+}
+
+
+class RecordSectionWidget(QWidget):
+    """
+    事件记录剖面：事件内所有台站的Z分量按P波到时对齐、归一化后垂直排列
+    所有波形作为一个 LineCollection 一次绘制
+    """
+    # 信号定义： event_id (str), station_id (str), pick_type (str), time (float, 相对记录起点)
+    pick_made = pyqtSignal(str, str, str, float)
+
+    def __init__(self, main_window, parent=None, pre=1.0, post=2.0, max_points=400):
+        super().__init__(parent)
+        self.main_window = main_window
+        # 显示窗口：P波前pre秒到P波后post秒；每道最多绘制约 2*max_points 个点
+        self.pre = pre
+        self.post = post
+        self.max_points = max_points
+
+        self.figure = Figure(figsize=(6, 8), dpi=100)
+        self.canvas = FigureCanvas(self.figure)
+        self.canvas.mpl_connect('button_press_event', self.on_mouse_click)
+        layout = QVBoxLayout()
+        layout.addWidget(self.canvas)
+        self.setLayout(layout)
+
+        self.axes = self.figure.add_subplot(1, 1, 1)
+        self.event_id = None
+        self.station_ids = [] # 第i行对应的台站
+        self.p_record = []    # 第i行台站的P波到时（相对记录起点）
+        self.pick_collections = []
+
+    def plot_event(self, loader, event_id, station_picks: dict, preprocessor=None):
+        """
+        绘制一个事件的记录剖面
+        :param station_picks: { (event_id, station_id): picks }，用于叠加拾取标记
+        :param preprocessor: 可选的 Preprocessor，所有台站的窗口一次批量滤波
+        """
+        self.axes.clear()
+        self.pick_collections = []
+        self.event_id = event_id
+        self.station_ids = []
+        self.p_record = []
+
+        keys = [(event_id, station_id) for station_id in sorted(loader.events.get(event_id, {}))]
+        streams = loader.load_windows(keys, self.pre, self.post, z_only=True)
+
+        traces = []
+        for (_, station_id), stream in streams.items():
+            z_trace = stream.select(component="Z") if stream else None
+            if not z_trace:
+                continue
+            p_arrival = get_p_arrival_time(z_trace[0])
+            if p_arrival == -12345.0:
+                continue
+            traces.append((station_id, z_trace[0], p_arrival))
+
+        if preprocessor is not None and traces:
+            filtered = preprocessor.process_traces([tr for _, tr, _ in traces])
+            traces = [(station_id, tr, p) for (station_id, _, p), tr in zip(traces, filtered)]
+
+        segments = []
+        for row, (station_id, tr, p_arrival) in enumerate(traces):
+            x = tr.times() - p_arrival
+            y = np.asarray(tr.data, dtype=np.float64)
+            x, y = decimate_minmax(x, y, self.max_points)
+            peak = np.max(np.abs(y)) if len(y) else 0.0
+            if peak > 0:
+                y = y / peak * 0.45
+            segments.append(np.column_stack([x, y + row]))
+            self.station_ids.append(station_id)
+            self.p_record.append(p_arrival + tr.stats.window_offset)
+
+        if not segments:
+            self.axes.text(0.5, 0.5, 'No P-window data', ha='center', va='center', transform=self.axes.transAxes)
+            self.canvas.draw_idle()
+            return
+
+        self.axes.add_collection(LineCollection(segments, colors='black', linewidths=0.6))
+        self.axes.axvline(0, color='gray', linestyle=':', linewidth=0.8)
+        self.axes.set_xlim(-self.pre, self.post)
+        self.axes.set_ylim(-1, len(segments))
+        step = max(1, len(segments) // 40)
+        self.axes.set_yticks(range(0, len(segments), step))
+        self.axes.set_yticklabels(self.station_ids[::step], fontsize=7)
+        self.axes.set_xlabel("Time relative to P (s)")
+        self.axes.set_title(event_id)
+
+        self.plot_picks(station_picks)
+
+    def plot_picks(self, station_picks: dict):
+        """叠加拾取标记，每种拾取类型一个 LineCollection"""
+        for collection in self.pick_collections:
+            collection.remove()
+        self.pick_collections = []
+
+        for pick_type, style in PICK_STYLES.items():
+            ticks = []
+            for row, station_id in enumerate(self.station_ids):
+                picks = station_picks.get((self.event_id, station_id), {})
+                if isinstance(picks.get(pick_type), (int, float)):
+                    x = picks[pick_type] - self.p_record[row]
+                    ticks.append([(x, row - 0.45), (x, row + 0.45)])
+            if ticks:
+                collection = LineCollection(ticks, linewidths=1.2, **style)
+                self.axes.add_collection(collection)
+                self.pick_collections.append(collection)
+
+        self.canvas.draw_idle()
+
+    def on_mouse_click(self, event):
+        """在剖面上拾取：行号确定台站，横坐标换算为相对该台站记录起点的时间"""
+        if event.inaxes != self.axes or not self.station_ids or event.ydata is None:
+            return
+
+        row = int(round(event.ydata))
+        if row < 0 or row >= len(self.station_ids):
+            return
+
+        pick_type = None
+        if event.button == 3:
+            pick_type = 'p_arrival'
+        elif event.button == 1:
+            pick_type = 'onset_time' if event.key == 'control' else 'end_time'
+
+        if pick_type:
+            self.pick_made.emit(self.event_id, self.station_ids[row], pick_type,
+                                float(self.p_record[row] + event.xdata))
@@ -0,0 +1,29 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+绘图用的波形抽稀
+"""
+
+import numpy as np
+
+
+def decimate_minmax(x, y, n_bins):
+    """
+    Min/max decimation for plotting: splits the samples into n_bins bins and keeps the
+    minimum and maximum of each bin in time order, so peaks survive at any zoom level.
+    Returns (x, y) unchanged if there are at most 2 * n_bins samples.
+    """
+    n = len(y)
+    if n_bins <= 0 or n <= 2 * n_bins:
+        return x, y
+
+    bin_size = int(np.ceil(n / n_bins))
+    k = n // bin_size
+    blocks = np.asarray(y[:k * bin_size]).reshape(k, bin_size)
+    base = np.arange(k)[:, None] * bin_size
+    idx = np.sort(np.column_stack([blocks.argmin(axis=1), blocks.argmax(axis=1)]), axis=1) + base
+    idx = idx.ravel()
+    if k * bin_size < n:
+        idx = np.concatenate([idx, np.arange(k * bin_size, n)[[0, -1]]])
+    return x[idx], y[idx]
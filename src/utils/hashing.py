@@ -0,0 +1,29 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+数据与文件的身份标识，用于缓存键
+"""
+
+import hashlib
+import json
+import numpy as np
+
+
+def data_fingerprint(data) -> str:
+    """
+    Content hash of a NumPy array (dtype, shape and bytes).
+    """
+    data = np.ascontiguousarray(data)
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{data.dtype.str}{data.shape}".encode())
+    h.update(data.tobytes())
+    return h.hexdigest()
+
+
+def make_key(*parts) -> str:
+    """
+    Stable hex key for any JSON-serializable parts.
+    """
+    text = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.blake2b(text.encode(), digest_size=16).hexdigest()